@@ -0,0 +1,127 @@
+"""
+Write-behind tracking of user activity.
+- lastActive is debounced to at most one write per user per LAST_ACTIVE_DEBOUNCE seconds
+- searchHistory entries are buffered and pushed in bulk, capped with $slice
+- A periodic job flushes everything with a single unordered bulk_write
+"""
+
+import asyncio
+import logging
+import time
+from pymongo import UpdateOne
+import config
+import repository
+
+logger = logging.getLogger(__name__)
+
+class UserActivityTracker:
+    """Buffers lastActive/searchHistory updates for the users collection"""
+
+    def __init__(self, debounce=config.LAST_ACTIVE_DEBOUNCE, max_pending=config.ACTIVITY_MAX_PENDING,
+                 history_limit=config.SEARCH_HISTORY_LIMIT):
+        self.debounce = debounce
+        self.max_pending = max_pending
+        self.history_limit = history_limit
+        self._last_active = {}  # telegramId -> latest activity timestamp not yet written
+        self._history = {}  # telegramId -> [searchHistory entries]
+        self._written_at = {}  # telegramId -> monotonic time of the last lastActive write
+        self._flush_lock = asyncio.Lock()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._last_active.keys() | self._history.keys())
+
+    def touch(self, telegram_id, when):
+        """Note that a user was active at `when` (non-blocking)"""
+        current = self._last_active.get(telegram_id)
+        if current is None or when > current:
+            self._last_active[telegram_id] = when
+
+    def mark_written(self, telegram_id):
+        """Record that lastActive was just written elsewhere (e.g. by /start)"""
+        self._written_at[telegram_id] = time.monotonic()
+        self._last_active.pop(telegram_id, None)
+
+    def record_search(self, telegram_id, query, when):
+        """Queue a search query for the user's history (non-blocking)"""
+        if telegram_id not in self._history and len(self._history) >= self.max_pending:
+            # Backlog is full until the next flush
+            self.dropped += 1
+            return
+        entries = self._history.setdefault(telegram_id, [])
+        entries.append({"query": query, "timestamp": when})
+        if len(entries) > self.history_limit:
+            # Older entries would be sliced off by the write anyway
+            del entries[:-self.history_limit]
+        self.touch(telegram_id, when)
+
+    def _take_due(self, now):
+        """Pop the updates that are allowed to be written now"""
+        last_active = {}
+        for telegram_id, when in list(self._last_active.items()):
+            # Users with pending history get lastActive for free in the same op
+            due = now - self._written_at.get(telegram_id, float("-inf")) >= self.debounce
+            if due or telegram_id in self._history:
+                last_active[telegram_id] = self._last_active.pop(telegram_id)
+
+        history, self._history = self._history, {}
+        return last_active, history
+
+    def _build_ops(self, last_active, history):
+        ops = []
+        for telegram_id in last_active.keys() | history.keys():
+            update = {}
+            if telegram_id in last_active:
+                update["$set"] = {"lastActive": last_active[telegram_id]}
+            if telegram_id in history:
+                update["$push"] = {"searchHistory": {
+                    "$each": history[telegram_id],
+                    "$slice": -self.history_limit
+                }}
+            ops.append(UpdateOne({"telegramId": telegram_id}, update))
+        return ops
+
+    def _restore(self, last_active, history):
+        """Merge a failed batch back in, dropping history that exceeds the bound"""
+        for telegram_id, when in last_active.items():
+            self.touch(telegram_id, when)
+        for telegram_id, entries in history.items():
+            if telegram_id not in self._history and len(self._history) >= self.max_pending:
+                self.dropped += len(entries)
+                continue
+            merged = entries + self._history.get(telegram_id, [])
+            self._history[telegram_id] = merged[-self.history_limit:]
+
+    def _prune(self, now):
+        """Forget debounce timestamps that no longer suppress anything"""
+        expired = [tid for tid, at in self._written_at.items() if now - at >= self.debounce]
+        for telegram_id in expired:
+            del self._written_at[telegram_id]
+
+    async def flush(self, force=False):
+        """Write due updates in one bulk_write; returns the number of ops"""
+        async with self._flush_lock:
+            now = float("inf") if force else time.monotonic()
+            last_active, history = self._take_due(now)
+            if not last_active and not history:
+                return 0
+
+            ops = self._build_ops(last_active, history)
+            try:
+                await repository.bulk_write_users(ops)
+            except Exception as e:
+                logger.error(f"User activity flush error: {e}")
+                self._restore(last_active, history)
+                return 0
+
+            written = time.monotonic()
+            for telegram_id in last_active:
+                self._written_at[telegram_id] = written
+            self._prune(written)
+            return len(ops)
+
+tracker = UserActivityTracker()
+
+async def flush_job(context):
+    """JobQueue callback for the periodic flush"""
+    await tracker.flush()
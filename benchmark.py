@@ -0,0 +1,340 @@
+"""
+Offline load test for the bot's handlers.
+- Seeds a synthetic catalog (1k-100k communities) into mongomock or a local mongod
+- Drives the real Application (handlers, update processor, rate limiter) with
+  synthetic Updates; a local Bot API transport answers and records every request
+- Reports updates/sec, p50/p95/p99 latency, DB ops and Telegram calls per update
+Usage:
+  python benchmark.py [--communities 10000] [--updates 5000] [--in-flight 64]
+  python benchmark.py --mongo-uri mongodb://localhost:27017  # scratch database, dropped first
+mongomock (pip install mongomock) scans collections in Python and has no $text,
+so it runs with the local search index and one DB thread (it is not thread-safe);
+use a local mongod for realistic DB timings.
+"""
+
+import argparse
+import asyncio
+import collections
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+from http import HTTPStatus
+
+# Per-update counters, visible to DB calls on executor threads (repository.run copies the context)
+_update_stats = contextvars.ContextVar("benchmark_update_stats", default=None)
+
+ENGLISH_WORDS = [
+    "tech", "code", "startup", "python", "design", "music", "fitness", "gym", "running", "football",
+    "business", "market", "crypto", "coffee", "travel", "photo", "art", "film", "study", "exam",
+    "university", "jobs", "health", "food", "fashion", "books", "news", "language", "english", "games"
+]
+AMHARIC_WORDS = ["ቴክ", "ስፖርት", "ጤና", "ሙዚቃ", "ትምህርት", "ንግድ", "ቡና", "መጽሐፍ", "ፊልም", "ስራ"]
+WORKLOAD = {"start": 0.05, "search_command": 0.15, "text_search": 0.35, "callback": 0.40, "add_community": 0.05}
+
+def _count(kind):
+    stats = _update_stats.get()
+    if stats is not None:
+        stats[kind] += 1
+
+class CountingCollection:
+    """Collection proxy counting the operations issued through it"""
+
+    OPERATIONS = {
+        "find", "find_one", "aggregate", "count_documents", "insert_one", "insert_many",
+        "update_one", "update_many", "replace_one", "delete_one", "delete_many", "bulk_write"
+    }
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name not in self.OPERATIONS:
+            return attribute
+
+        def counted(*args, **kwargs):
+            _count("db")
+            return attribute(*args, **kwargs)
+        return counted
+
+def _bot_api_request_class():
+    from telegram.request import BaseRequest
+
+    class LocalBotAPI(BaseRequest):
+        """Bot API transport that answers locally and records what was sent"""
+
+        def __init__(self):
+            self.calls = collections.Counter()
+            self.page_callbacks = collections.deque(maxlen=200)
+            self.errors = 0
+            self._message_id = 0
+
+        @property
+        def read_timeout(self):
+            return None
+
+        async def initialize(self):
+            pass
+
+        async def shutdown(self):
+            pass
+
+        def _message(self, parameters):
+            self._message_id += 1
+            chat_id = parameters.get("chat_id") or 1
+            return {
+                "message_id": self._message_id, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "text": parameters.get("text", "")
+            }
+
+        async def do_request(self, url, method, request_data=None, read_timeout=None,
+                             write_timeout=None, connect_timeout=None, pool_timeout=None):
+            endpoint = url.rsplit("/", 1)[-1]
+            parameters = request_data.parameters if request_data else {}
+            self.calls[endpoint] += 1
+            _count("telegram")
+
+            if endpoint == "getMe":
+                result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+            elif endpoint in ("sendMessage", "editMessageText"):
+                if "error occurred" in parameters.get("text", ""):
+                    self.errors += 1
+                markup = parameters.get("reply_markup")
+                if isinstance(markup, str):
+                    markup = json.loads(markup)
+                for row in (markup or {}).get("inline_keyboard", []):
+                    for button in row:
+                        if button.get("callback_data", "").startswith("page_"):
+                            self.page_callbacks.append(button["callback_data"])
+                result = self._message(parameters)
+            else:
+                result = True
+            return HTTPStatus.OK, json.dumps({"ok": True, "result": result}).encode()
+
+    return LocalBotAPI
+
+def _community(rng, index, config):
+    words = rng.sample(ENGLISH_WORDS, 3)
+    if rng.random() < 0.3:
+        words.append(rng.choice(AMHARIC_WORDS))
+    city = rng.choice(config.LOCATIONS)
+    members = int(rng.paretovariate(1.2) * 50)
+    link = f"https://t.me/bench_{index}"
+    return {
+        "name": " ".join(word.capitalize() for word in words[:2]) + f" {index}",
+        "description": f"Community about {' and '.join(words)} in {city}",
+        "category": rng.choice(config.CATEGORIES),
+        "members": members,
+        # Both location formats exist in production data
+        "location": {"city": city, "region": ""} if rng.random() < 0.8 else city,
+        "language": rng.choice(config.LANGUAGES),
+        "link": link,
+        "linkKey": link,
+        "keywords": words,
+        "approved": True,
+        "score": round(rng.random() * 5, 4),
+        "metrics": {"searchHits": 0, "clicks": 0, "userRating": 0}
+    }
+
+def seed(collection, count, rng, config, batch_size=1000):
+    for start in range(0, count, batch_size):
+        collection.insert_many([_community(rng, index, config) for index in range(start, min(start + batch_size, count))])
+
+def _message_update(update_id, user_id, text):
+    message = {
+        "message_id": update_id, "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Bench", "username": f"user{user_id}"},
+        "text": text
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+def _callback_update(update_id, user_id, data):
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "chat_instance": "benchmark", "data": data,
+        "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+        "message": {
+            "message_id": update_id, "date": int(time.time()), "text": "…",
+            "chat": {"id": user_id, "type": "private"}
+        }
+    }}
+
+def synthetic_update(update_id, rng, users, transport, config):
+    """(kind, update dict) drawn from the WORKLOAD mix"""
+    kind = rng.choices(list(WORKLOAD), weights=list(WORKLOAD.values()))[0]
+    user_id = rng.randint(1, users)
+    query = " ".join(rng.sample(ENGLISH_WORDS + AMHARIC_WORDS, rng.randint(1, 2)))
+
+    if kind == "start":
+        return kind, _message_update(update_id, user_id, "/start")
+    if kind == "search_command":
+        return kind, _message_update(update_id, user_id, f"/search {query}")
+    if kind == "text_search":
+        return kind, _message_update(update_id, user_id, query)
+    if kind == "add_community":
+        city = rng.choice(config.LOCATIONS)
+        text = (f"/add Bench {update_id} | {query} community | {rng.choice(config.CATEGORIES)} | english "
+                f"| {city} | https://t.me/bench_new_{update_id}")
+        return kind, _message_update(update_id, user_id, text)
+
+    if transport.page_callbacks and rng.random() < 0.5:
+        data = rng.choice(transport.page_callbacks)
+    elif rng.random() < 0.5:
+        data = f"category_{rng.choice(config.CATEGORIES)}"
+    else:
+        data = f"location_{rng.choice(config.LOCATIONS).lower().replace(' ', '')}"
+    return kind, _callback_update(update_id, user_id, data)
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+async def _process(application, update, kind, results):
+    stats = collections.Counter()
+    _update_stats.set(stats)
+    started = time.perf_counter()
+    await application.update_processor.process_update(update, application.process_update(update))
+    results.append((kind, time.perf_counter() - started, stats["db"], stats["telegram"]))
+
+async def drive(application, transport, args, config):
+    from telegram import Update
+
+    rng = random.Random(args.seed)
+    results = []
+    in_flight = set()
+    started = None
+
+    for update_id in range(1, args.warmup + args.updates + 1):
+        if update_id == args.warmup + 1:
+            await asyncio.gather(*in_flight)
+            results.clear()
+            transport.calls.clear()
+            transport.errors = 0
+            started = time.perf_counter()
+
+        kind, data = synthetic_update(update_id, rng, args.users, transport, config)
+        update = Update.de_json(data, application.bot)
+        task = asyncio.create_task(_process(application, update, kind, results))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        if len(in_flight) >= args.in_flight:
+            await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+    await asyncio.gather(*in_flight)
+    return results, time.perf_counter() - (started or time.perf_counter())
+
+def report(results, elapsed, transport, args, backend):
+    import rendering
+    import repository
+
+    print(f"Catalog: {args.communities:,} communities ({backend}), {len(results):,} updates, {args.in_flight} in flight")
+    print(f"Throughput: {len(results) / elapsed:,.1f} updates/sec over {elapsed:.2f}s")
+    print(f"{'kind':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'db ops':>10}{'tg calls':>10}")
+
+    by_kind = collections.defaultdict(list)
+    for result in results:
+        by_kind[result[0]].append(result)
+        by_kind["all"].append(result)
+
+    for kind in ["all"] + sorted(kind for kind in by_kind if kind != "all"):
+        rows = by_kind[kind]
+        latencies = sorted(row[1] * 1000 for row in rows)
+        print(
+            f"{kind:<16}{len(rows):>8}"
+            f"{percentile(latencies, 0.50):>10.2f}{percentile(latencies, 0.95):>10.2f}{percentile(latencies, 0.99):>10.2f}"
+            f"{sum(row[2] for row in rows) / len(rows):>10.2f}{sum(row[3] for row in rows) / len(rows):>10.2f}"
+        )
+
+    print(f"Telegram calls: {dict(transport.calls)}")
+    print(f"Error replies: {transport.errors}")
+    print(f"Query cache: {repository.query_cache.stats()}")
+    print(f"Render cache: {rendering.cache.stats()}")
+
+async def main_async(args):
+    backend = args.mongo_uri or "mongomock"
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(args.mongo_uri)
+        client.drop_database(args.database)
+    else:
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit("mongomock is not installed: pip install mongomock (or pass --mongo-uri)")
+        client = mongomock.MongoClient()
+
+    import config
+    import database
+    import indexes
+
+    # Point the data layer at the scratch database, counting every operation
+    db = client[args.database]
+    database.client = client
+    database.db = db
+    for name in ("communities", "users", "analytics", "pending_submissions"):
+        setattr(database, name, CountingCollection(db[name]))
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    seed(db["communities"], args.communities, rng, config)
+    print(f"Seeded {args.communities:,} communities in {time.perf_counter() - started:.1f}s")
+    if args.mongo_uri:
+        indexes.reconcile_text_index(db["communities"])
+    indexes.ensure_indexes(db)
+
+    import bot
+    import repository
+
+    if not args.cold:
+        await repository.refresh_catalog()
+    await repository.build_search_index()
+
+    transport = _bot_api_request_class()()
+    application = bot.build_application(request=transport)
+    await application.initialize()
+    try:
+        results, elapsed = await drive(application, transport, args, config)
+    finally:
+        await application.shutdown()
+
+    report(results, elapsed, transport, args, backend)
+    if args.mongo_uri:
+        client.drop_database(args.database)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test for the bot's handlers")
+    parser.add_argument("--communities", type=int, default=10000)
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--in-flight", type=int, default=64, help="updates submitted but not finished")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mongo-uri", help="local mongod to use instead of mongomock")
+    parser.add_argument("--database", default="benchmark_communities")
+    parser.add_argument("--cold", action="store_true", help="browse from MongoDB instead of the in-memory snapshot")
+    parser.add_argument("--rate-limit", action="store_true", help="keep Telegram rate limits (off by default)")
+    args = parser.parse_args(argv)
+
+    # Configuration is read at import time, so set it before importing the bot
+    os.environ.setdefault("BOT_TOKEN", "123456:benchmark")
+    os.environ.pop("SHARED_STATE_PATH", None)
+    os.environ["SCALE_ROLE"] = "single"
+    if not args.mongo_uri:
+        os.environ["LOCAL_SEARCH_INDEX"] = "true"
+        # mongomock is not thread-safe: concurrent calls from the executor corrupt its state
+        os.environ["DB_EXECUTOR_WORKERS"] = "1"
+    if not args.rate_limit:
+        for name in ("TELEGRAM_GLOBAL_RATE", "TELEGRAM_CHAT_RATE", "TELEGRAM_GROUP_RATE"):
+            os.environ[name] = "1000000"
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.ERROR)
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -7,11 +7,27 @@ Ethiopian Telegram Communities Bot
 
 import logging
 import os
+import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes, CallbackContext
 from dotenv import load_dotenv
 import config
-from database import communities, users, analytics, init_db, setup_indexes
+import repository
+import metrics
+import activity
+import pagination
+import startup
+import popularity
+import rendering
+import instrumentation
+import member_counts
+import recommendations
+import digest
+import dedup
+from pymongo.errors import DuplicateKeyError
+from ratelimit import limiter
+from concurrency import UserOrderedUpdateProcessor
+import scaling
 
 # Load environment variables
 load_dotenv()
@@ -23,9 +39,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize database
-init_db()
-
 # Command Handlers
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send welcome message when the command /start is issued."""
@@ -39,11 +52,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     }
     
     # Update or insert user data
-    users.update_one(
-        {"telegramId": user_data["telegramId"]},
-        {"$set": user_data},
-        upsert=True
-    )
+    await repository.upsert_user(user_data)
+    activity.tracker.mark_written(user_data["telegramId"])
     
     await update.message.reply_text(
         "👋 Welcome to Ethiopian Telegram Communities Bot!\n\n"
@@ -52,6 +62,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/search - Search for communities\n"
         "/categories - Browse by category\n"
         "/location - Filter by location\n"
+        "/recommend - Communities picked for you\n"
         "/submit - Submit a new community\n"
         "/help - Show help information"
     )
@@ -59,16 +70,14 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send help information when the command /help is issued."""
     # Update last active timestamp
-    users.update_one(
-        {"telegramId": update.effective_user.id},
-        {"$set": {"lastActive": update.message.date}}
-    )
+    activity.tracker.touch(update.effective_user.id, update.message.date)
     
     await update.message.reply_text(
         "Ethiopian Telegram Communities Bot Help:\n\n"
         "• Use /search to find communities by keywords\n"
         "• Use /categories to browse by category\n"
         "• Use /location to filter by city/region\n"
+        "• Use /recommend for communities matching your searches\n"
         "• Use /submit to add a new community\n\n"
         "Examples:\n"
         "- /search programming (find tech communities)\n"
@@ -79,10 +88,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def categories(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Display categories to browse"""
     # Update last active timestamp
-    users.update_one(
-        {"telegramId": update.effective_user.id},
-        {"$set": {"lastActive": update.message.date}}
-    )
+    activity.tracker.touch(update.effective_user.id, update.message.date)
     
     # Use categories from config
     keyboard = []
@@ -91,7 +97,8 @@ async def categories(update: Update, context: ContextTypes.DEFAULT_TYPE):
     for i, category in enumerate(config.CATEGORIES):
         # Create button with emoji based on category
         emoji = get_category_emoji(category)
-        button = InlineKeyboardButton(f"{emoji} {category.capitalize()}", callback_data=f"category_{category}")
+        label = with_count(f"{emoji} {category.capitalize()}", repository.count_browse_cached("c", category))
+        button = InlineKeyboardButton(label, callback_data=f"category_{category}")
         
         row.append(button)
         
@@ -103,6 +110,10 @@ async def categories(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text("Select a category to browse:", reply_markup=reply_markup)
 
+def with_count(label, count):
+    """Append a community count to a button label when it is known"""
+    return label if count is None else f"{label} ({count})"
+
 def get_category_emoji(category):
     """Return emoji for a given category"""
     emoji_map = {
@@ -118,10 +129,7 @@ def get_category_emoji(category):
 async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /search command"""
     # Update last active timestamp
-    users.update_one(
-        {"telegramId": update.effective_user.id},
-        {"$set": {"lastActive": update.message.date}}
-    )
+    activity.tracker.touch(update.effective_user.id, update.message.date)
     
     if not context.args:
         await update.message.reply_text(
@@ -135,10 +143,7 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     search_query = ' '.join(context.args)
     
     # Record search query in user's history
-    users.update_one(
-        {"telegramId": update.effective_user.id},
-        {"$push": {"searchHistory": {"query": search_query, "timestamp": update.message.date}}}
-    )
+    activity.tracker.record_search(update.effective_user.id, search_query, update.message.date)
     
     await perform_search(update, search_query)
 
@@ -146,61 +151,48 @@ async def perform_search(update: Update, search_query: str):
     """Search for communities based on the query"""
     try:
         # Perform text search
-        results = communities.find({
-            "$text": {"$search": search_query}
-        }).limit(5)
-        
-        result_list = list(results)
+        result_list = await repository.search_communities(search_query, limit=5)
         
         if not result_list:
             await update.message.reply_text(f"No communities found for '{search_query}'. Try different keywords or use /categories to browse.")
             return
         
-        await update.message.reply_text(f"Found {len(result_list)} communities matching '{search_query}':")
+        # Track search hits for these communities
+        metrics.aggregator.record_many([community.id for community in result_list], "searchHits")
+        
+        # All results in one message, each card rendered once per community version
+        text, reply_markup = rendering.search_message(search_query, result_list)
+        await update.message.reply_text(text, parse_mode=rendering.PARSE_MODE, reply_markup=reply_markup)
         
-        for community in result_list:
-            # Track search hit for this community
-            communities.update_one(
-                {"_id": community["_id"]},
-                {"$inc": {"metrics.searchHits": 1}}
-            )
-            
-            # Create join button for each community
-            keyboard = [[InlineKeyboardButton("Join Group", url=community["link"])]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            # Format member count
-            member_count = f"{community['members']:,}"
-            
-            # Get location string (handle both formats)
-            if isinstance(community.get('location'), dict):
-                location_str = community['location'].get('city', 'Unknown')
-            else:
-                location_str = community.get('location', 'Unknown')
-            
-            # Send community information
-            await update.message.reply_text(
-                f"📱 *{community['name']}*\n"
-                f"📝 {community['description']}\n"
-                f"👥 Members: {member_count}\n"
-                f"🗣️ Language: {community['language'].capitalize()}\n"
-                f"📍 Location: {location_str}\n"
-                f"🏷️ Category: {community['category'].capitalize()}",
-                parse_mode="Markdown",
-                reply_markup=reply_markup
-            )
-            
     except Exception as e:
         logger.error(f"Search error: {e}")
         await update.message.reply_text("Sorry, an error occurred while searching. Please try again later.")
 
+async def recommend_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the user's precomputed recommendations"""
+    activity.tracker.touch(update.effective_user.id, update.message.date)
+    
+    try:
+        result_list = await repository.find_recommendations(update.effective_user.id)
+        
+        if not result_list:
+            await update.message.reply_text(
+                "I don't have recommendations for you yet. Search with /search or browse /categories, "
+                "and check back later."
+            )
+            return
+        
+        text, reply_markup = rendering.recommendation_message(result_list)
+        await update.message.reply_text(text, parse_mode=rendering.PARSE_MODE, reply_markup=reply_markup)
+        
+    except Exception as e:
+        logger.error(f"Recommendation error: {e}")
+        await update.message.reply_text("Sorry, an error occurred. Please try again later.")
+
 async def submit_community(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /submit command to add new communities"""
     # Update last active timestamp
-    users.update_one(
-        {"telegramId": update.effective_user.id},
-        {"$set": {"lastActive": update.message.date}}
-    )
+    activity.tracker.touch(update.effective_user.id, update.message.date)
     
     await update.message.reply_text(
         "To submit a new Telegram community, please provide the following information:\n\n"
@@ -217,10 +209,7 @@ async def submit_community(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def add_community(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Process new community submission"""
     # Update last active timestamp
-    users.update_one(
-        {"telegramId": update.effective_user.id},
-        {"$set": {"lastActive": update.message.date}}
-    )
+    activity.tracker.touch(update.effective_user.id, update.message.date)
     
     text = update.message.text
     
@@ -241,7 +230,8 @@ async def add_community(update: Update, context: ContextTypes.DEFAULT_TYPE):
     name, description, category, language, location, link = parts
     
     # Validate the link
-    if not link.startswith('https://t.me/'):
+    link_key = dedup.canonical_link(link)
+    if not link.startswith('https://t.me/') or not link_key:
         await update.message.reply_text("❌ Invalid Telegram link. It should start with https://t.me/")
         return
     
@@ -257,12 +247,18 @@ async def add_community(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"❌ Invalid language. Please use one of: {language_list}")
         return
     
+    # The same link (in any spelling) may only be listed once
+    if await repository.find_by_link(link_key):
+        await update.message.reply_text("ℹ️ This community has already been submitted. Thank you!")
+        return
+    
     # Create new community entry
     new_community = {
         "name": name,
         "description": description,
         "category": category.lower(),
-        "members": 0,  # Will be updated later
+        "members": 0,  # Filled in by member_counts.py once approved
+        "score": 0.0,  # Popularity score, recomputed by popularity.py
         "language": language.lower(),
         "location": {
             "city": location,
@@ -287,37 +283,90 @@ async def add_community(update: Update, context: ContextTypes.DEFAULT_TYPE):
     }
     
     try:
+        # Flag likely duplicates by name/description for the admins reviewing it
+        new_community.update(dedup.dedup_fields(new_community))
+        similar = await repository.find_similar_communities(new_community)
+        if similar:
+            new_community["possibleDuplicates"] = [community["_id"] for community in similar]
+        
         # Add to database (pending approval)
-        result = communities.insert_one(new_community)
+        community_id = await repository.insert_submission(new_community)
         
         # Update user's submitted communities
-        users.update_one(
-            {"telegramId": update.effective_user.id},
-            {"$push": {"submittedCommunities": result.inserted_id}}
-        )
+        await repository.add_submitted_community(update.effective_user.id, community_id)
         
         await update.message.reply_text(
             "✅ Thank you! Your community submission has been received and is pending approval."
         )
         
+    except DuplicateKeyError:
+        # Submitted concurrently by someone else
+        await update.message.reply_text("ℹ️ This community has already been submitted. Thank you!")
     except Exception as e:
         logger.error(f"Error adding community: {e}")
         await update.message.reply_text("Sorry, an error occurred while submitting the community. Please try again later.")
 
+def is_admin(user_id):
+    """Check whether a Telegram user may moderate submissions"""
+    return user_id in config.ADMIN_IDS
+
+async def pending_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """List submissions awaiting approval (admins only)"""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("❌ This command is only available to admins.")
+        return
+    
+    pending = await repository.find_pending(limit=10)
+    if not pending:
+        await update.message.reply_text("No submissions are awaiting approval.")
+        return
+    
+    lines = ["Pending submissions (approve with /approve [id]):", ""]
+    for community in pending:
+        lines.append(f"{community['_id']} - {community['name']} ({community['link']})")
+        if community.get("possibleDuplicates"):
+            duplicates = ", ".join(str(duplicate_id) for duplicate_id in community["possibleDuplicates"])
+            lines.append(f"   ⚠️ Possible duplicate of: {duplicates}")
+    
+    await update.message.reply_text("\n".join(lines))
+
+async def approve_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Approve a pending submission (admins only)"""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("❌ This command is only available to admins.")
+        return
+    
+    if not context.args:
+        await update.message.reply_text("Please provide the submission id: /approve [id]")
+        return
+    
+    try:
+        approved = await repository.approve_community(context.args[0], update.message.date)
+    except DuplicateKeyError:
+        await update.message.reply_text("❌ A community with the same link is already listed.")
+        return
+    except Exception as e:
+        logger.error(f"Error approving community: {e}")
+        await update.message.reply_text("Sorry, an error occurred while approving. Please try again later.")
+        return
+    
+    if approved:
+        await update.message.reply_text("✅ Community approved.")
+    else:
+        await update.message.reply_text("❌ No pending submission found with that id.")
+
 async def location_filter(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Filter communities by location"""
     # Update last active timestamp
-    users.update_one(
-        {"telegramId": update.effective_user.id},
-        {"$set": {"lastActive": update.message.date}}
-    )
+    activity.tracker.touch(update.effective_user.id, update.message.date)
     
     # Use locations from config
     keyboard = []
     row = []
     
     for i, location in enumerate(config.LOCATIONS):
-        button = InlineKeyboardButton(location, callback_data=f"location_{location.lower().replace(' ', '')}")
+        label = with_count(location, repository.count_browse_cached("l", location))
+        button = InlineKeyboardButton(label, callback_data=f"location_{location.lower().replace(' ', '')}")
         
         row.append(button)
         
@@ -338,55 +387,13 @@ async def handle_callback(update: Update, context: CallbackContext):
     await query.answer()
     
     # Update last active timestamp
-    users.update_one(
-        {"telegramId": update.effective_user.id},
-        {"$set": {"lastActive": query.message.date}}
-    )
+    activity.tracker.touch(update.effective_user.id, query.message.date)
     
     callback_data = query.data
     
     if callback_data.startswith("category_"):
         category = callback_data.split("_")[1]
-        
-        try:
-            results = communities.find({"category": category, "approved": True})
-            
-            result_list = list(results)
-            if not result_list:
-                await query.message.reply_text(f"No communities found in the {category} category.")
-                return
-            
-            await query.message.reply_text(f"Found {len(result_list)} communities in {category}:")
-            
-            for community in result_list:
-                keyboard = [[InlineKeyboardButton("Join Group", url=community["link"])]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                # Track click
-                communities.update_one(
-                    {"_id": community["_id"]},
-                    {"$inc": {"metrics.clicks": 1}}
-                )
-                
-                # Get location string (handle both formats)
-                if isinstance(community.get('location'), dict):
-                    location_str = community['location'].get('city', 'Unknown')
-                else:
-                    location_str = community.get('location', 'Unknown')
-                
-                await query.message.reply_text(
-                    f"📱 *{community['name']}*\n"
-                    f"📝 {community['description']}\n"
-                    f"👥 Members: {community['members']:,}\n"
-                    f"🗣️ Language: {community['language'].capitalize()}\n"
-                    f"📍 Location: {location_str}",
-                    parse_mode="Markdown",
-                    reply_markup=reply_markup
-                )
-                
-        except Exception as e:
-            logger.error(f"Category filter error: {e}")
-            await query.message.reply_text("Sorry, an error occurred. Please try again later.")
+        await send_browse_page(query, "c", category)
     
     elif callback_data.startswith("location_"):
         location_code = callback_data.split("_")[1]
@@ -395,71 +402,79 @@ async def handle_callback(update: Update, context: CallbackContext):
             await query.message.reply_text("Showing communities from all locations. Use /categories to browse by interest.")
             return
         
-        # Find the actual location name from the location code
-        location_name = None
-        for loc in config.LOCATIONS:
-            if loc.lower().replace(' ', '') == location_code:
-                location_name = loc
-                break
+        await send_browse_page(query, "l", location_code)
+    
+    elif callback_data.startswith(f"{pagination.CALLBACK_PREFIX}_"):
+        try:
+            kind, code, direction, cursor = pagination.decode(callback_data)
+        except ValueError:
+            await query.message.reply_text("This page is no longer available. Please browse again.")
+            return
         
-        if not location_name:
+        await send_browse_page(query, kind, code, cursor, direction)
+
+def location_from_code(location_code):
+    """Find the actual location name from a location code"""
+    for loc in config.LOCATIONS:
+        if loc.lower().replace(' ', '') == location_code:
+            return loc
+    return None
+
+async def send_browse_page(query, kind, code, cursor=None, direction=pagination.NEXT):
+    """Show one page of a category ("c") or location ("l") listing in a single message"""
+    if kind == "c":
+        key = code
+        title = f"the {code} category"
+    else:
+        key = location_from_code(code)
+        title = key
+        if not key:
             await query.message.reply_text("Invalid location selected.")
             return
+    
+    try:
+        page, has_prev, has_next = await repository.browse_page(kind, key, cursor, direction)
+        
+        if not page:
+            if cursor is None:
+                await query.message.reply_text(f"No communities found in {title}.")
+            else:
+                await query.message.edit_text(f"No more communities in {title}.")
+            return
         
-        try:
-            # Search for communities in this location (supporting both location formats)
-            results = communities.find({
-                "$or": [
-                    {"location": location_name},
-                    {"location.city": location_name}
-                ],
-                "approved": True
-            })
-            
-            result_list = list(results)
-            if not result_list:
-                await query.message.reply_text(f"No communities found in {location_name}.")
-                return
-            
-            await query.message.reply_text(f"Found {len(result_list)} communities in {location_name}:")
-            
-            for community in result_list:
-                keyboard = [[InlineKeyboardButton("Join Group", url=community["link"])]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                # Track click
-                communities.update_one(
-                    {"_id": community["_id"]},
-                    {"$inc": {"metrics.clicks": 1}}
-                )
-                
-                await query.message.reply_text(
-                    f"📱 *{community['name']}*\n"
-                    f"📝 {community['description']}\n"
-                    f"👥 Members: {community['members']:,}\n"
-                    f"🗣️ Language: {community['language'].capitalize()}\n"
-                    f"🏷️ Category: {community['category'].capitalize()}",
-                    parse_mode="Markdown",
-                    reply_markup=reply_markup
-                )
-                
-        except Exception as e:
-            logger.error(f"Location filter error: {e}")
-            await query.message.reply_text("Sorry, an error occurred. Please try again later.")
+        total = await repository.count_browse(kind, key)
+        
+        def navigation(shown):
+            # Cursors come from the communities that fit in the message, not the whole page
+            buttons = []
+            if has_prev:
+                buttons.append(InlineKeyboardButton("⬅️ Prev", callback_data=pagination.encode(kind, code, pagination.PREV, shown[0])))
+            if has_next or len(shown) < len(page):
+                buttons.append(InlineKeyboardButton("Next ➡️", callback_data=pagination.encode(kind, code, pagination.NEXT, shown[-1])))
+            return buttons
+        
+        text, reply_markup, shown = rendering.browse_message(title, total, kind, page, navigation)
+        
+        # Track click
+        metrics.aggregator.record_many([community.id for community in shown], "clicks")
+        
+        if cursor is None:
+            await query.message.reply_text(text, parse_mode=rendering.PARSE_MODE, reply_markup=reply_markup)
+        else:
+            # Page through in place instead of sending another message
+            await query.message.edit_text(text, parse_mode=rendering.PARSE_MODE, reply_markup=reply_markup)
+        
+    except Exception as e:
+        logger.error(f"Browse error: {e}")
+        await query.message.reply_text("Sorry, an error occurred. Please try again later.")
 
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle text messages as search queries"""
     # Update last active timestamp
-    users.update_one(
-        {"telegramId": update.effective_user.id},
-        {"$set": {"lastActive": update.message.date}}
-    )
+    activity.tracker.touch(update.effective_user.id, update.message.date)
     
     # Record search query in user's history
-    users.update_one(
-        {"telegramId": update.effective_user.id},
-        {"$push": {"searchHistory": {"query": update.message.text, "timestamp": update.message.date}}}
-    )
+    activity.tracker.record_search(update.effective_user.id, update.message.text, update.message.date)
     
     await perform_search(update, update.message.text)
 
@@ -467,33 +482,183 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Log errors caused by updates."""
     logger.warning(f'Update "{update}" caused error "{context.error}"')
 
-def main():
-    """Start the bot"""
+async def catalog_refresh_job(context: CallbackContext):
+    """Rebuild the in-memory browse snapshot"""
     try:
-        # Create application
-        application = ApplicationBuilder().token(config.BOT_TOKEN).build()
-        
-        # Register command handlers
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(CommandHandler("categories", categories))
-        application.add_handler(CommandHandler("search", search_command))
-        application.add_handler(CommandHandler("submit", submit_community))
-        application.add_handler(CommandHandler("add", add_community))
-        application.add_handler(CommandHandler("location", location_filter))
-        
-        # Register callback handler for buttons
-        application.add_handler(CallbackQueryHandler(handle_callback))
-        
-        # Handle text messages (for search queries without command)
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text_message))
-        
-        # Register error handler
-        application.add_error_handler(error_handler)
-        
-        # Start the Bot
+        await repository.refresh_catalog()
+    except Exception as e:
+        logger.error(f"Catalog refresh error: {e}")
+
+async def post_init(application):
+    """Start database setup in the background so updates are handled right away"""
+    application.create_task(startup.run(), name="startup")
+    
+    try:
+        application.bot_data["metrics_server"] = await instrumentation.start_metrics_server()
+    except OSError as e:
+        # e.g. several workers on one host sharing METRICS_PORT
+        logger.error(f"Could not start metrics endpoint: {e}")
+
+async def post_shutdown(application):
+    """Release resources once the bot has stopped"""
+    repository.stop_catalog_change_stream()
+    
+    metrics_server = application.bot_data.get("metrics_server")
+    if metrics_server is not None:
+        metrics_server.close()
+    
+    # Write out buffered counters and activity before the executor goes away
+    await metrics.aggregator.flush()
+    await activity.tracker.flush(force=True)
+    repository.shutdown()
+
+def schedule_catalog_jobs(application):
+    """Jobs that work on the whole catalog or user base; run by the single or ingress process only"""
+    # Periodically recompute popularity scores from click/search-hit buckets
+    application.job_queue.run_repeating(
+        popularity.refresh_scores_job,
+        interval=config.POPULARITY_INTERVAL,
+        first=config.POPULARITY_INTERVAL
+    )
+    
+    # Rebuild personalized recommendations (skipped without NumPy/SciPy)
+    if recommendations.available():
+        application.job_queue.run_repeating(
+            recommendations.refresh_job,
+            interval=config.RECOMMEND_INTERVAL,
+            first=120
+        )
+    else:
+        logger.warning("NumPy/SciPy not installed: /recommend will only serve stored recommendations")
+    
+    # Weekly digest of new communities
+    if config.DIGEST_ENABLED:
+        application.job_queue.run_daily(
+            digest.digest_job,
+            time=datetime.time(hour=config.DIGEST_HOUR, tzinfo=datetime.timezone.utc),
+            days=(config.DIGEST_WEEKDAY,)
+        )
+        # Finish a run interrupted by a restart or crash within the same week
+        application.job_queue.run_repeating(
+            digest.resume_job,
+            interval=config.DIGEST_RESUME_INTERVAL,
+            first=60
+        )
+    
+    # Keep member counts of approved communities fresh
+    application.job_queue.run_repeating(
+        member_counts.refresh_job,
+        interval=config.MEMBER_REFRESH_INTERVAL,
+        first=60
+    )
+
+def build_application(request=None):
+    """Create the application with all handlers and background jobs"""
+    builder = (
+        ApplicationBuilder()
+        .token(config.BOT_TOKEN)
+        .concurrent_updates(UserOrderedUpdateProcessor(config.CONCURRENT_UPDATES))
+        .rate_limiter(limiter)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    
+    # Custom Bot API transport (benchmark.py answers requests locally)
+    if request is not None:
+        builder = builder.request(request)
+    
+    application = builder.build()
+    
+    # Register command handlers
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("categories", categories))
+    application.add_handler(CommandHandler("search", search_command))
+    application.add_handler(CommandHandler("recommend", recommend_command))
+    application.add_handler(CommandHandler("submit", submit_community))
+    application.add_handler(CommandHandler("add", add_community))
+    application.add_handler(CommandHandler("location", location_filter))
+    application.add_handler(CommandHandler("pending", pending_command))
+    application.add_handler(CommandHandler("approve", approve_command))
+    
+    # Register callback handler for buttons
+    application.add_handler(CallbackQueryHandler(handle_callback))
+    
+    # Handle text messages (for search queries without command)
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text_message))
+    
+    # Register error handler
+    application.add_error_handler(error_handler)
+    
+    # Latency and DB/Telegram call counts for every handler registered above
+    instrumentation.instrument_application(application)
+    instrumentation.registry.add_gauges("query_cache", repository.query_cache.stats)
+    instrumentation.registry.add_gauges("render_cache", rendering.cache.stats)
+    instrumentation.registry.add_gauges("rate_limiter", limiter.stats)
+    instrumentation.registry.add_gauges("startup", startup.stats)
+    application.job_queue.run_repeating(
+        instrumentation.log_summary_job,
+        interval=config.INSTRUMENTATION_LOG_INTERVAL,
+        first=config.INSTRUMENTATION_LOG_INTERVAL
+    )
+    
+    # Periodically flush buffered metrics counters
+    application.job_queue.run_repeating(
+        metrics.flush_job,
+        interval=config.METRICS_FLUSH_INTERVAL,
+        first=config.METRICS_FLUSH_INTERVAL
+    )
+    
+    # Periodically flush buffered user activity
+    application.job_queue.run_repeating(
+        activity.flush_job,
+        interval=config.ACTIVITY_FLUSH_INTERVAL,
+        first=config.ACTIVITY_FLUSH_INTERVAL
+    )
+    
+    # Catalog-wide jobs run once per deployment, not in every worker
+    if config.SCALE_ROLE == "single":
+        schedule_catalog_jobs(application)
+    
+    # Periodically rebuild the browse snapshot (change streams keep it current in between)
+    application.job_queue.run_repeating(
+        catalog_refresh_job,
+        interval=config.CATALOG_REFRESH_INTERVAL,
+        first=config.CATALOG_REFRESH_INTERVAL
+    )
+    
+    return application
+
+def run_application(application):
+    """Receive updates through a webhook or long polling"""
+    if config.BOT_MODE == "webhook":
+        logger.info(f"Starting bot in webhook mode on port {config.WEBHOOK_PORT}...")
+        application.run_webhook(
+            listen=config.WEBHOOK_LISTEN,
+            port=config.WEBHOOK_PORT,
+            url_path=config.WEBHOOK_PATH,
+            webhook_url=f"{config.WEBHOOK_URL.rstrip('/')}/{config.WEBHOOK_PATH}",
+            secret_token=config.WEBHOOK_SECRET,
+            max_connections=config.WEBHOOK_MAX_CONNECTIONS
+        )
+    else:
         logger.info("Starting bot...")
         application.run_polling()
+
+def main():
+    """Start the bot"""
+    try:
+        if config.SCALE_ROLE == "worker":
+            # Handle updates queued by the ingress process
+            logger.info("Starting bot worker...")
+            scaling.run_worker(build_application())
+        elif config.SCALE_ROLE == "ingress":
+            # Only receive updates and queue them for workers
+            application = scaling.build_ingress_application()
+            schedule_catalog_jobs(application)
+            run_application(application)
+        else:
+            run_application(build_application())
         
     except Exception as e:
         logger.error(f"Failed to start bot: {e}")
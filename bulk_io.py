@@ -0,0 +1,241 @@
+"""
+Bulk import and export of communities.
+- Streams JSONL or CSV (chosen by file extension, or --format)
+- Validates category, language and city against config, normalizes the
+  location string/dict forms and deduplicates rows by canonical link
+- Upserts in batched unordered bulk_write calls keyed by linkKey (dedup.py)
+- Exports with a streaming cursor; both directions report docs/sec
+Usage:
+  python bulk_io.py import communities.jsonl [--pending] [--batch-size 1000]
+  python bulk_io.py export communities.csv [--pending]
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+import config
+import dedup
+from popularity import compute_score
+
+# Column order of CSV files (keywords are separated by ";")
+CSV_FIELDS = ["name", "description", "category", "language", "city", "region", "link", "members", "keywords"]
+
+_CATEGORIES = {category.lower(): category for category in config.CATEGORIES}
+_LANGUAGES = {language.lower(): language for language in config.LANGUAGES}
+_LOCATIONS = {location.lower(): location for location in config.LOCATIONS}
+
+class InvalidRecord(ValueError):
+    pass
+
+def normalize_location(location, region=""):
+    """{"city", "region"} from either the plain-string or the dict form"""
+    if isinstance(location, dict):
+        city, region = location.get("city") or "", location.get("region") or region
+    else:
+        city = location or ""
+
+    city = city.strip()
+    if city.lower() not in _LOCATIONS:
+        raise InvalidRecord(f"unknown location {city!r}")
+    return {"city": _LOCATIONS[city.lower()], "region": (region or "").strip()}
+
+def _keywords(value):
+    if isinstance(value, str):
+        value = value.split(";")
+    return [keyword.strip() for keyword in value or [] if keyword and keyword.strip()]
+
+def validate(record):
+    """Community fields from one raw JSONL/CSV record (raises InvalidRecord)"""
+    name = (record.get("name") or "").strip()
+    if not name:
+        raise InvalidRecord("missing name")
+
+    link = dedup.canonical_link(record.get("link"))
+    if not link:
+        raise InvalidRecord(f"invalid Telegram link {record.get('link')!r}")
+
+    category = (record.get("category") or "").strip().lower()
+    if category not in _CATEGORIES:
+        raise InvalidRecord(f"unknown category {category!r}")
+
+    language = (record.get("language") or "").strip().lower()
+    if language not in _LANGUAGES:
+        raise InvalidRecord(f"unknown language {language!r}")
+
+    members = record.get("members")
+    try:
+        # Left out when the file has no count, so a refreshed count is not overwritten
+        members = None if members in (None, "") else int(members)
+    except (TypeError, ValueError):
+        raise InvalidRecord(f"invalid member count {record.get('members')!r}")
+
+    community = {
+        "name": name,
+        "description": (record.get("description") or "").strip(),
+        "category": category,
+        "language": language,
+        "location": normalize_location(record.get("location") or record.get("city"), record.get("region")),
+        "link": link,
+        "keywords": _keywords(record.get("keywords")) or [category]
+    }
+    if members is not None:
+        community["members"] = members
+    return community
+
+def _file_format(path, explicit):
+    if explicit:
+        return explicit
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+def read_records(stream, file_format):
+    """Yield (raw record, line number) without loading the whole file (JSONL lines are parsed later)"""
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield row, reader.line_num
+        return
+
+    for line_number, line in enumerate(stream, 1):
+        if line.strip():
+            yield line, line_number
+
+def build_upsert(community, approved, now):
+    """Upsert keyed by canonical link; fields the bot maintains are only set on insert"""
+    on_insert = {
+        "createdAt": now,
+        "score": compute_score(community.get("members", 0), 0),
+        "verifiedStatus": False,
+        "activityLevel": "medium"
+    }
+    if approved:
+        # New approved communities are picked up by the weekly digest
+        on_insert["approvedAt"] = now
+    if "members" not in community:
+        # Without a count in the file, keep the one the member count refresher maintains
+        on_insert["members"] = 0
+    return UpdateOne(
+        {"linkKey": community["link"]},
+        {
+            "$set": {**community, **dedup.dedup_fields(community), "approved": approved, "updatedAt": now},
+            "$setOnInsert": on_insert
+        },
+        upsert=True
+    )
+
+def import_communities(collection, stream, file_format="jsonl", approved=True, batch_size=1000, log=print):
+    """Validate and upsert every record of a stream; returns a summary dict"""
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    summary = {"read": 0, "invalid": 0, "duplicates": 0, "inserted": 0, "updated": 0}
+    batch = {}  # link -> community, so a repeated link inside a batch is written once
+
+    def write_batch():
+        if not batch:
+            return
+        ops = [build_upsert(community, approved, now) for community in batch.values()]
+        result = collection.bulk_write(ops, ordered=False)
+        summary["inserted"] += result.upserted_count
+        summary["updated"] += result.modified_count
+        batch.clear()
+
+    seen = set()
+    for record, line_number in read_records(stream, file_format):
+        summary["read"] += 1
+        try:
+            if isinstance(record, str):
+                record = json.loads(record)
+            community = validate(record)
+        except (ValueError, AttributeError) as e:
+            summary["invalid"] += 1
+            log(f"Skipping line {line_number}: {e}")
+            continue
+
+        if community["link"] in seen:
+            summary["duplicates"] += 1
+        seen.add(community["link"])
+        batch[community["link"]] = community
+
+        if len(batch) >= batch_size:
+            write_batch()
+
+    write_batch()
+    summary["seconds"] = time.perf_counter() - started
+    return summary
+
+def _csv_row(community):
+    location = community.get("location")
+    if not isinstance(location, dict):
+        location = {"city": location or "", "region": ""}
+    return {
+        "name": community.get("name", ""),
+        "description": community.get("description", ""),
+        "category": community.get("category", ""),
+        "language": community.get("language", ""),
+        "city": location.get("city", ""),
+        "region": location.get("region", ""),
+        "link": community.get("link", ""),
+        "members": community.get("members", 0),
+        "keywords": ";".join(community.get("keywords") or [])
+    }
+
+def export_communities(collection, stream, file_format="jsonl", batch_size=1000):
+    """Stream communities into a JSONL/CSV file; returns (count, seconds)"""
+    started = time.perf_counter()
+    projection = {field: 1 for field in CSV_FIELDS if field not in ("city", "region")}
+    projection.update({"location": 1, "_id": 0})
+    cursor = collection.find({}, projection).sort("_id", 1).batch_size(batch_size)
+
+    writer = None
+    if file_format == "csv":
+        writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+
+    count = 0
+    for community in cursor:
+        if writer:
+            writer.writerow(_csv_row(community))
+        else:
+            stream.write(json.dumps(community, ensure_ascii=False, default=str) + "\n")
+        count += 1
+    return count, time.perf_counter() - started
+
+def _rate(count, seconds):
+    return count / seconds if seconds > 0 else float(count)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import/export of communities")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pending", action="store_true", help="use pending_submissions instead of communities")
+    args = parser.parse_args(argv)
+
+    import database
+    collection = database.pending_submissions if args.pending else database.communities
+
+    file_format = _file_format(args.path, args.format)
+    if args.command == "import":
+        with open(args.path, newline="", encoding="utf-8") as stream:
+            summary = import_communities(
+                collection, stream, file_format,
+                approved=not args.pending, batch_size=args.batch_size,
+                log=lambda message: print(message, file=sys.stderr)
+            )
+        written = summary["inserted"] + summary["updated"]
+        print(
+            f"Read {summary['read']} records: {summary['inserted']} inserted, {summary['updated']} updated, "
+            f"{summary['duplicates']} duplicate links, {summary['invalid']} invalid "
+            f"({_rate(summary['read'], summary['seconds']):.0f} docs/sec, {written} written)"
+        )
+    else:
+        with open(args.path, "w", newline="", encoding="utf-8") as stream:
+            count, seconds = export_communities(collection, stream, file_format, batch_size=args.batch_size)
+        print(f"Exported {count} communities in {seconds:.1f}s ({_rate(count, seconds):.0f} docs/sec)")
+
+if __name__ == "__main__":
+    main()
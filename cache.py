@@ -0,0 +1,84 @@
+"""
+In-memory query result cache.
+- Keys are normalized query text plus filters
+- Size bounded with LRU eviction and per-entry TTL expiry
+- Cleared whenever the catalog changes (insert/approval)
+- Shared between processes through shared.py when SHARED_STATE_PATH is set
+"""
+
+import time
+from collections import OrderedDict
+import config
+import shared
+
+def make_key(kind, query="", **filters):
+    """Build a cache key from a query kind, the query text and any filters"""
+    normalized = " ".join(str(query).lower().split())
+    return (kind, normalized, tuple(sorted(filters.items())))
+
+class QueryCache:
+    """LRU cache with TTL expiry and hit/miss counters"""
+
+    def __init__(self, max_size=config.CACHE_MAX_SIZE, ttl=config.CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, key, loader):
+        """Return the cached value for key, or await loader() and cache it"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = await loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, kind=None):
+        """Drop all entries, or only those of one query kind"""
+        if kind is None:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if k[0] == kind]:
+            del self._entries[key]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0
+        }
+
+_MISSING = object()
+
+query_cache = shared.SharedQueryCache(shared.store) if shared.store else QueryCache()
@@ -0,0 +1,186 @@
+"""
+Precomputed catalog snapshots for browsing.
+- Per category and per city: approved communities in browse order, plus counts
+- Built in full at startup and on a timer, updated incrementally from change
+  streams (when the deployment supports them) and from this process's own writes
+- Serves browse pages from memory with zero database reads
+- Listings hold CommunityRecord objects rather than documents
+"""
+
+import bisect
+import logging
+import threading
+import pagination
+from records import CARD_PROJECTION
+
+logger = logging.getLogger(__name__)
+
+# Fields needed to render a browse listing
+LISTING_PROJECTION = CARD_PROJECTION
+
+def _sort_key(value, community_id):
+    # Ascending key for BROWSE_SORT (sort value desc, _id desc)
+    return (-value, -int(str(community_id), 16))
+
+def _community_key(community):
+    return _sort_key(getattr(community, pagination.SORT_FIELD), community.id)
+
+class _Listing:
+    """Communities of one category/city, kept sorted in browse order"""
+
+    def __init__(self):
+        self.keys = []
+        self.communities = []
+
+    def insert(self, community):
+        key = _community_key(community)
+        position = bisect.bisect_left(self.keys, key)
+        self.keys.insert(position, key)
+        self.communities.insert(position, community)
+
+    def remove(self, community):
+        key = _community_key(community)
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            del self.keys[position]
+            del self.communities[position]
+
+class CatalogSnapshot:
+    """In-memory browse listings keyed by ("c", category) and ("l", city)"""
+
+    def __init__(self):
+        self.ready = False
+        self._listings = {}
+        self._communities = {}  # community_id -> community in the listings
+
+    def _buckets(self, community):
+        buckets = [("c", community.category)]
+        if community.city:
+            buckets.append(("l", community.city))
+        return buckets
+
+    def build(self, communities):
+        """Replace the snapshot with a full set of approved community records"""
+        listings = {}
+        by_id = {}
+        for community in communities:
+            by_id[community.id] = community
+            for bucket in self._buckets(community):
+                listings.setdefault(bucket, _Listing())
+
+        # Sort once per bucket instead of inserting one by one
+        ordered = sorted(by_id.values(), key=_community_key)
+        for community in ordered:
+            for bucket in self._buckets(community):
+                listing = listings[bucket]
+                listing.keys.append(_community_key(community))
+                listing.communities.append(community)
+
+        self._listings = listings
+        self._communities = by_id
+        self.ready = True
+
+    def apply(self, community):
+        """Add, move or update one community (removing it if no longer approved)"""
+        self.remove(community.id)
+        if not community.approved:
+            return
+        for bucket in self._buckets(community):
+            self._listings.setdefault(bucket, _Listing()).insert(community)
+        self._communities[community.id] = community
+
+    def update_score(self, community_id, score):
+        """Move a listed community to its new position after its score changed"""
+        community = self._communities.get(community_id)
+        if community is not None and community.score != score:
+            self.apply(community.with_score(score))
+
+    def remove(self, community_id):
+        community = self._communities.pop(community_id, None)
+        if community is None:
+            return
+        for bucket in self._buckets(community):
+            listing = self._listings.get(bucket)
+            if listing:
+                listing.remove(community)
+
+    def get(self, community_id):
+        return self._communities.get(community_id)
+
+    def count(self, kind, key):
+        listing = self._listings.get((kind, key))
+        return len(listing.keys) if listing else 0
+
+    def page(self, kind, key, cursor=None, direction=pagination.NEXT, page_size=5):
+        """Same contract as repository.browse_page: (communities, has_prev, has_next)"""
+        listing = self._listings.get((kind, key))
+        if listing is None:
+            return [], False, False
+
+        total = len(listing.keys)
+        if cursor is None:
+            start = 0
+        elif direction == pagination.NEXT:
+            start = bisect.bisect_right(listing.keys, _sort_key(*cursor))
+        else:
+            end = bisect.bisect_left(listing.keys, _sort_key(*cursor))
+            start = max(0, end - page_size)
+            return listing.communities[start:end], start > 0, end < total
+
+        end = start + page_size
+        return listing.communities[start:end], start > 0, end < total
+
+class ChangeStreamWatcher:
+    """Feeds community change events into the in-memory views from a background thread"""
+
+    def __init__(self, collection, on_change, on_delete, fields=LISTING_PROJECTION):
+        self.collection = collection
+        self.fields = fields
+        self.on_change = on_change
+        self.on_delete = on_delete
+        self._stream = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="catalog-change-stream", daemon=True)
+        self._thread.start()
+
+    def _pipeline(self):
+        # Skip updates that touch no watched field (e.g. metrics counter flushes)
+        listing_updated = [
+            {f"updateDescription.updatedFields.{field}": {"$exists": True}}
+            for field in self.fields
+        ]
+        return [
+            {"$match": {"$or": [
+                {"operationType": {"$in": ["insert", "replace", "delete"]}},
+                *listing_updated
+            ]}},
+            # Only ship the watched fields of the looked-up document
+            {"$project": {
+                "operationType": 1, "documentKey": 1, "fullDocument._id": 1,
+                **{f"fullDocument.{field}": 1 for field in self.fields}
+            }}
+        ]
+
+    def _run(self):
+        try:
+            with self.collection.watch(self._pipeline(), full_document="updateLookup") as stream:
+                self._stream = stream
+                for change in stream:
+                    if self._stopped.is_set():
+                        break
+                    if change["operationType"] == "delete":
+                        self.on_delete(change["documentKey"]["_id"])
+                    elif change.get("fullDocument") is not None:
+                        self.on_change(change["fullDocument"])
+        except Exception as e:
+            if not self._stopped.is_set():
+                # Standalone servers have no change streams; the refresh timer still applies
+                logger.warning(f"Catalog change stream unavailable, relying on periodic refresh: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        if self._stream is not None:
+            self._stream.close()
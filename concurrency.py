@@ -0,0 +1,56 @@
+"""
+Concurrent update processing with per-user ordering.
+- Up to max_concurrent_updates updates are handled at the same time
+- Updates from the same user (or chat) are handled one after another, in arrival order
+"""
+
+import asyncio
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+def ordering_key(update):
+    """The user (or chat) whose updates must not be reordered, or None"""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user is not None:
+        return ("user", update.effective_user.id)
+    if update.effective_chat is not None:
+        return ("chat", update.effective_chat.id)
+    return None
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Bounded concurrency across users, sequential processing per user"""
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}  # key -> [lock, number of updates holding or waiting for it]
+
+    async def process_update(self, update, coroutine):
+        key = ordering_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+
+        try:
+            # Wait for this user's earlier updates before taking a concurrency slot,
+            # so one busy user cannot tie up slots that other users could use
+            async with entry[0]:
+                await super().process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
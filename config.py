@@ -8,6 +8,9 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 MONGO_URI = os.getenv("MONGO_URI")
 
+# Telegram ids allowed to moderate submissions
+ADMIN_IDS = [int(admin_id) for admin_id in os.getenv("ADMIN_IDS", "").split(",") if admin_id.strip()]
+
 # Categories
 CATEGORIES = ["tech", "fitness", "education", "business", "arts", "entertainment"]
 
@@ -23,4 +26,116 @@ LOCATIONS = [
 ]
 
 # Default language options
-LANGUAGES = ["english", "amharic", "both"]
\ No newline at end of file
+LANGUAGES = ["english", "amharic", "both"]
+
+# Estimated name/description similarity (0-1) at which a submission is flagged as a likely duplicate
+DUPLICATE_SIMILARITY = float(os.getenv("DUPLICATE_SIMILARITY", "0.7"))
+
+# Rendered community cards kept in memory
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "4096"))
+
+# Local Prometheus-style metrics endpoint (0 disables it) and handler summary log interval
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9102"))
+INSTRUMENTATION_LOG_INTERVAL = int(os.getenv("INSTRUMENTATION_LOG_INTERVAL", "300"))
+
+# Personalized recommendations (recommendations.py, needs NumPy and SciPy): job interval
+# (seconds), communities kept per user, users scored per matrix product, decay of search
+# history, weight of submitted communities, and popularity boost (tie-breaker)
+RECOMMEND_INTERVAL = int(os.getenv("RECOMMEND_INTERVAL", "21600"))
+RECOMMEND_TOP_N = int(os.getenv("RECOMMEND_TOP_N", "10"))
+RECOMMEND_BATCH_SIZE = int(os.getenv("RECOMMEND_BATCH_SIZE", "1000"))
+RECOMMEND_HALF_LIFE_HOURS = float(os.getenv("RECOMMEND_HALF_LIFE_HOURS", "336"))
+RECOMMEND_SUBMISSION_WEIGHT = float(os.getenv("RECOMMEND_SUBMISSION_WEIGHT", "2"))
+RECOMMEND_POPULARITY_WEIGHT = float(os.getenv("RECOMMEND_POPULARITY_WEIGHT", "0.1"))
+
+# Weekly digest of new communities (digest.py): off unless enabled; sent on DIGEST_WEEKDAY
+# (0 = Sunday) at DIGEST_HOUR UTC, at DIGEST_RATE messages per second over DIGEST_CONCURRENCY
+# workers, DIGEST_BATCH_SIZE users per checkpoint, covering the last DIGEST_LOOKBACK_DAYS
+DIGEST_ENABLED = os.getenv("DIGEST_ENABLED", "false").lower() == "true"
+DIGEST_WEEKDAY = int(os.getenv("DIGEST_WEEKDAY", "1"))
+DIGEST_HOUR = int(os.getenv("DIGEST_HOUR", "7"))
+DIGEST_RATE = float(os.getenv("DIGEST_RATE", "20"))
+DIGEST_CONCURRENCY = int(os.getenv("DIGEST_CONCURRENCY", "8"))
+DIGEST_BATCH_SIZE = int(os.getenv("DIGEST_BATCH_SIZE", "500"))
+DIGEST_LOOKBACK_DAYS = int(os.getenv("DIGEST_LOOKBACK_DAYS", "7"))
+DIGEST_MAX_COMMUNITIES = int(os.getenv("DIGEST_MAX_COMMUNITIES", "5"))
+DIGEST_RESUME_INTERVAL = int(os.getenv("DIGEST_RESUME_INTERVAL", "900"))  # seconds between checks for an interrupted run
+
+# Member count refresher: job interval (seconds), communities per run, parallel lookups,
+# lookups per second, age after which a count is refreshed, and communities per write batch
+MEMBER_REFRESH_INTERVAL = int(os.getenv("MEMBER_REFRESH_INTERVAL", "600"))
+MEMBER_REFRESH_BATCH = int(os.getenv("MEMBER_REFRESH_BATCH", "2000"))
+MEMBER_REFRESH_CONCURRENCY = int(os.getenv("MEMBER_REFRESH_CONCURRENCY", "4"))
+MEMBER_REFRESH_RATE = float(os.getenv("MEMBER_REFRESH_RATE", "5"))
+MEMBER_REFRESH_MAX_AGE_HOURS = float(os.getenv("MEMBER_REFRESH_MAX_AGE_HOURS", "24"))
+MEMBER_REFRESH_WRITE_BATCH = int(os.getenv("MEMBER_REFRESH_WRITE_BATCH", "200"))
+
+# Database connection pool / executor sizing
+DB_MAX_POOL_SIZE = int(os.getenv("DB_MAX_POOL_SIZE", "50"))
+DB_MIN_POOL_SIZE = int(os.getenv("DB_MIN_POOL_SIZE", "0"))
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "16"))
+# Longest wait between startup connection attempts while MongoDB is unreachable
+STARTUP_CONNECT_MAX_DELAY = int(os.getenv("STARTUP_CONNECT_MAX_DELAY", "60"))  # seconds
+
+# Number of updates the bot may process at the same time (updates from one user stay in order)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "32"))
+
+# How updates are received: "polling" or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # Public base URL, e.g. https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8443")))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # Checked against Telegram's secret token header
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# Multi-process mode: "single" (default), "ingress" (receives and queues updates)
+# or "worker" (processes queued updates); ingress and workers run on one host and
+# share SHARED_STATE_PATH, a local file (not on a network filesystem)
+SCALE_ROLE = os.getenv("SCALE_ROLE", "single").lower()
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "")  # SQLite file, e.g. /var/lib/bot/shared.db
+SHARED_VISIBILITY_TIMEOUT = int(os.getenv("SHARED_VISIBILITY_TIMEOUT", "60"))  # seconds before a claim is retried
+SHARED_DEDUP_WINDOW = int(os.getenv("SHARED_DEDUP_WINDOW", "3600"))  # seconds update_ids are remembered
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "0.2"))  # seconds
+
+
+# Metrics counters are buffered in memory and flushed periodically
+METRICS_FLUSH_INTERVAL = int(os.getenv("METRICS_FLUSH_INTERVAL", "30"))  # seconds
+METRICS_MAX_PENDING = int(os.getenv("METRICS_MAX_PENDING", "5000"))  # communities
+
+# User activity (lastActive/searchHistory) is written behind in batches
+ACTIVITY_FLUSH_INTERVAL = int(os.getenv("ACTIVITY_FLUSH_INTERVAL", "15"))  # seconds
+LAST_ACTIVE_DEBOUNCE = int(os.getenv("LAST_ACTIVE_DEBOUNCE", "300"))  # seconds per user
+ACTIVITY_MAX_PENDING = int(os.getenv("ACTIVITY_MAX_PENDING", "10000"))  # users
+
+# Maximum number of searchHistory entries kept per user (oldest are dropped)
+SEARCH_HISTORY_LIMIT = int(os.getenv("SEARCH_HISTORY_LIMIT", "50"))
+
+# Query result cache
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "1024"))  # entries
+CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))  # seconds
+
+# In-process search index (replaces MongoDB $text search once built)
+LOCAL_SEARCH_INDEX = os.getenv("LOCAL_SEARCH_INDEX", "false").lower() == "true"
+SEARCH_POPULARITY_WEIGHT = float(os.getenv("SEARCH_POPULARITY_WEIGHT", "0.3"))  # weight of the popularity score
+
+# Communities shown per page when browsing categories and locations
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "5"))
+
+# Seconds between full rebuilds of the in-memory browse snapshot
+CATALOG_REFRESH_INTERVAL = int(os.getenv("CATALOG_REFRESH_INTERVAL", "900"))
+
+# Outbound Telegram rate limits (requests per second)
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_GROUP_RATE = float(os.getenv("TELEGRAM_GROUP_RATE", str(20 / 60)))
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+
+# Popularity scores computed from hourly searchHits/clicks buckets
+POPULARITY_INTERVAL = int(os.getenv("POPULARITY_INTERVAL", "3600"))  # seconds between recomputations
+POPULARITY_WINDOW_DAYS = int(os.getenv("POPULARITY_WINDOW_DAYS", "30"))  # event buckets kept and scored
+POPULARITY_HALF_LIFE_HOURS = float(os.getenv("POPULARITY_HALF_LIFE_HOURS", "168"))
+CLICK_WEIGHT = float(os.getenv("CLICK_WEIGHT", "1"))
+SEARCH_HIT_WEIGHT = float(os.getenv("SEARCH_HIT_WEIGHT", "0.2"))
\ No newline at end of file
@@ -1,7 +1,10 @@
 import certifi
 import ssl
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne, UpdateOne
 import config
+import dedup
+import indexes
+import instrumentation
 
 # Connect to MongoDB with enhanced SSL settings
 client = MongoClient(
@@ -11,7 +14,11 @@ client = MongoClient(
     ssl=True,
     # ssl_cert_reqs=ssl.CERT_NONE,  # Disable strict certificate validation
     tlsInsecure=True,  # Additional fallback option
-    serverSelectionTimeoutMS=10000
+    serverSelectionTimeoutMS=10000,
+    maxPoolSize=config.DB_MAX_POOL_SIZE,
+    minPoolSize=config.DB_MIN_POOL_SIZE,
+    # Counts commands per handled update (see instrumentation.py)
+    event_listeners=[instrumentation.command_listener]
 )
 db = client["eth_telegram_communities"]
 
@@ -19,46 +26,74 @@ db = client["eth_telegram_communities"]
 communities = db["communities"]
 users = db["users"]
 analytics = db["analytics"]
+pending_submissions = db["pending_submissions"]
+recommendations = db["recommendations"]  # Precomputed by recommendations.py, keyed by telegramId
+digest_runs = db["digest_runs"]  # One checkpoint document per weekly digest run
 
-# Create text index for search
+# Create indexes for search and browsing
 def setup_indexes():
     try:
-        # Remove existing text indexes first
-        try:
-            communities.drop_index("name_text_description_text_keywords_text")
-            print("Successfully dropped existing text index")
-        except Exception as e:
-            print(f"Note: {e}")
+        # Text index with multilingual support (only rebuilt when its definition changed)
+        status = indexes.reconcile_text_index(communities)
+        print(f"Text index with language: none {status}")
         
-        # Create new index with multilingual support
-        communities.create_index([
-            ("name", "text"), 
-            ("description", "text"),
-            ("keywords", "text")
-        ], default_language="none")
-        print("Successfully created text index with language: none")
+        # Indexes for browse filters and user lookups
+        indexes.ensure_indexes(db)
+        indexes.log_explain_report(db)
     except Exception as e:
         print(f"Warning: Could not set up indexes: {e}")
         print("Continuing without database indexes...")
 
-# Initialize database
-def init_db():
-    # Test the connection first
+# Test the connection
+def ping():
     try:
         # The ismaster command is cheap and does not require auth
         client.admin.command('ismaster')
         print("MongoDB connection successful")
+        return True
     except Exception as e:
         print(f"MongoDB connection error: {e}")
         print("Continuing with limited functionality...")
+        return False
+
+# Check if we need to add sample data
+def seed_if_empty():
+    if communities.count_documents({}) == 0:
+        add_sample_data()
+
+# Initialize database (blocking; the bot runs these steps concurrently in startup.py)
+def init_db():
+    if not ping():
         return
     
     # Setup indexes
     setup_indexes()
-    
-    # Check if we need to add sample data
-    if communities.count_documents({}) == 0:
-        add_sample_data()
+    seed_if_empty()
+
+def trim_search_history(limit=config.SEARCH_HISTORY_LIMIT):
+    """Cap every user's searchHistory to the most recent `limit` entries"""
+    # Only documents with more than `limit` entries match searchHistory.<limit>
+    result = users.update_many(
+        {f"searchHistory.{limit}": {"$exists": True}},
+        {"$push": {"searchHistory": {"$each": [], "$slice": -limit}}}
+    )
+    return result.modified_count
+
+def migrate_pending_submissions(batch_size=1000):
+    """Move unapproved documents out of communities into pending_submissions"""
+    moved = 0
+    while True:
+        batch = list(communities.find({"approved": False}).limit(batch_size))
+        if not batch:
+            return moved
+        
+        # Upserts keyed by _id, so re-running after an interruption is harmless
+        pending_submissions.bulk_write([
+            ReplaceOne({"_id": submission["_id"]}, submission, upsert=True)
+            for submission in batch
+        ], ordered=False)
+        communities.delete_many({"_id": {"$in": [submission["_id"] for submission in batch]}})
+        moved += len(batch)
 
 def add_sample_data():
     sample_communities = [
@@ -93,15 +128,23 @@ def add_sample_data():
         }
     ]
     
-    # Insert one by one to avoid batch errors
+    # For Amharic entries, copy display_language to language for consistency in your code
     for community in sample_communities:
-        try:
-            # For Amharic entries, handle differently
-            if "display_language" in community:
-                # Copy the value to language for consistency in your code
-                community["language"] = community["display_language"]
-                
-            communities.insert_one(community)
-            print(f"Added community: {community['name']}")
-        except Exception as e:
-            print(f"Error inserting {community['name']}: {e}")
\ No newline at end of file
+        if "display_language" in community:
+            community["language"] = community["display_language"]
+        # Browse pagination needs the sort field on every listing; popularity.py recomputes it
+        community["score"] = 0.0
+    
+    # One unordered batch of upserts keyed by canonical link, so re-seeding never duplicates
+    try:
+        result = communities.bulk_write([
+            UpdateOne(
+                {"linkKey": dedup.canonical_link(community["link"])},
+                {"$setOnInsert": {**community, **dedup.dedup_fields(community)}},
+                upsert=True
+            )
+            for community in sample_communities
+        ], ordered=False)
+        print(f"Added {result.upserted_count} sample communities")
+    except Exception as e:
+        print(f"Error inserting sample communities: {e}")
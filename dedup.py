@@ -0,0 +1,160 @@
+"""
+Duplicate detection for community submissions.
+- canonical_link maps the many spellings of a Telegram link to one key
+  (stored as linkKey, unique-indexed): t.me/foo, @foo, t.me/s/foo and
+  t.me/foo/123 are all https://t.me/foo
+- MinHash signatures over character shingles of the normalized name and
+  description (Ethiopic variants folded) estimate text similarity
+- Signatures are split into LSH bands stored in an indexed array, so likely
+  duplicates are found with one indexed lookup instead of a collection scan
+Run `python dedup.py` to backfill linkKey/signatures on existing communities
+and list the duplicate links that block the unique index.
+"""
+
+import hashlib
+import re
+from urllib.parse import urlsplit
+from pymongo import UpdateOne
+import config
+from search_index import normalize
+
+SHINGLE_SIZE = 3
+NUM_HASHES = 32
+ROWS_PER_BAND = 4  # 8 bands: pairs above ~0.6 similarity almost always share a band
+
+_PRIME = (1 << 61) - 1
+_HOSTS = {"t.me", "www.t.me", "telegram.me", "www.telegram.me", "telegram.dog"}
+_SPACE_RE = re.compile(r"\W+")
+
+def _permutations():
+    # Fixed seeds so signatures stay comparable across processes and restarts
+    seeds = hashlib.blake2b(b"community-minhash", digest_size=64).digest()
+    params = []
+    for i in range(NUM_HASHES):
+        digest = hashlib.blake2b(seeds + bytes([i]), digest_size=16).digest()
+        params.append((int.from_bytes(digest[:8], "big") % (_PRIME - 1) + 1, int.from_bytes(digest[8:], "big") % _PRIME))
+    return params
+
+_PERMUTATIONS = _permutations()
+
+def canonical_link(link):
+    """https://t.me/<path> for any t.me/telegram.me spelling, or None if it is not one"""
+    link = (link or "").strip()
+    if link.startswith("@"):
+        link = "t.me/" + link[1:]
+    if "://" not in link:
+        link = "https://" + link
+
+    parts = urlsplit(link)
+    if parts.hostname not in _HOSTS:
+        return None
+
+    path = parts.path.strip("/")
+    if not path:
+        return None
+    # Invite hashes (joinchat/..., +...) are case-sensitive; usernames are not
+    if path.startswith(("joinchat/", "+")):
+        return f"https://t.me/{path}"
+
+    segments = path.lower().split("/")
+    if segments[0] == "s" and len(segments) > 1:
+        # Web preview (t.me/s/<username>) of a public channel
+        segments = segments[1:]
+    # Message links: t.me/<username>/<id> and t.me/c/<chat id>/<id>
+    segments = segments[:2] if segments[0] == "c" else segments[:1]
+    return "https://t.me/" + "/".join(segments)
+
+def shingles(text):
+    """Character shingles of normalized text (works for Ethiopic and Latin alike)"""
+    text = _SPACE_RE.sub(" ", normalize(text)).strip()
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+def signature(text):
+    """MinHash signature (NUM_HASHES ints) of the text's shingles"""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big")
+        for shingle in shingles(text)
+    ]
+    if not hashes:
+        return []
+    return [min((a * value + b) % _PRIME for value in hashes) for a, b in _PERMUTATIONS]
+
+def bands(sig):
+    """LSH band keys ("<band>:<hash>") for a signature"""
+    keys = []
+    for start in range(0, len(sig), ROWS_PER_BAND):
+        band = ",".join(str(value) for value in sig[start:start + ROWS_PER_BAND])
+        keys.append(f"{start // ROWS_PER_BAND}:{hashlib.blake2b(band.encode(), digest_size=8).hexdigest()}")
+    return keys
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    if not sig_a or not sig_b:
+        return 0.0
+    return sum(a == b for a, b in zip(sig_a, sig_b)) / len(sig_a)
+
+def community_text(community):
+    return f"{community.get('name') or ''} {community.get('description') or ''}"
+
+def dedup_fields(community):
+    """Fields stored on a community for duplicate lookups"""
+    sig = signature(community_text(community))
+    return {"linkKey": canonical_link(community.get("link")), "minhash": sig, "lshBands": bands(sig)}
+
+def find_similar(collection, fields, threshold=config.DUPLICATE_SIMILARITY, limit=50, exclude_id=None):
+    """Communities sharing an LSH band whose estimated similarity reaches threshold"""
+    if not fields["lshBands"]:
+        return []
+    query = {"lshBands": {"$in": fields["lshBands"]}}
+    if exclude_id is not None:
+        query["_id"] = {"$ne": exclude_id}
+
+    matches = []
+    for candidate in collection.find(query, {"name": 1, "link": 1, "minhash": 1}).limit(limit):
+        score = similarity(fields["minhash"], candidate.get("minhash"))
+        if score >= threshold:
+            matches.append((score, candidate))
+    matches.sort(key=lambda item: item[0], reverse=True)
+    return [candidate for _, candidate in matches]
+
+def backfill(collection, batch_size=1000):
+    """Store dedup fields on every community; returns (updated, duplicate links)"""
+    ops = []
+    updated = 0
+    seen = {}
+    duplicates = []
+    for community in collection.find({}, {"name": 1, "description": 1, "link": 1}).sort("_id", 1).batch_size(batch_size):
+        fields = dedup_fields(community)
+        key = fields["linkKey"]
+        if key in seen:
+            duplicates.append((key, seen[key], community["_id"]))
+            # Leave the later copy without linkKey so the unique index can still be built
+            del fields["linkKey"]
+        elif key:
+            seen[key] = community["_id"]
+        else:
+            del fields["linkKey"]
+
+        ops.append(UpdateOne({"_id": community["_id"]}, {"$set": fields}))
+        if len(ops) >= batch_size:
+            updated += collection.bulk_write(ops, ordered=False).modified_count
+            ops = []
+
+    if ops:
+        updated += collection.bulk_write(ops, ordered=False).modified_count
+    return updated, duplicates
+
+if __name__ == "__main__":
+    import logging
+    import indexes
+    from database import db
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    for collection_name in ("communities", "pending_submissions"):
+        updated, duplicates = backfill(db[collection_name])
+        print(f"Stored dedup fields on {updated} documents in {collection_name}")
+        for key, first_id, duplicate_id in duplicates:
+            print(f"Duplicate link {key}: {duplicate_id} duplicates {first_id}")
+    indexes.ensure_indexes(db)
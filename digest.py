@@ -0,0 +1,278 @@
+"""
+Weekly digests of new communities matching each user's interests.
+- Users are streamed from MongoDB in _id order with a batched cursor
+- A user's interest profile is the set of search terms that match this week's new
+  communities; users with the same profile share one rendered digest
+- Messages go through a queue drained by DIGEST_CONCURRENCY workers, paced by a
+  token bucket (DIGEST_RATE) below the global rate limit so replies keep flowing
+- Each batch of users is claimed in `digest_runs` with a compare-and-set on the
+  checkpoint before it is sent: concurrent runs share the work instead of repeating
+  it, an interrupted run resumes after the last claimed batch, and nobody gets the
+  week's digest twice
+- resume_job picks up an unfinished run of the current week (e.g. after a restart)
+
+Run directly to send the current week's digest: python digest.py
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from telegram.error import BadRequest, Forbidden
+import config
+import database
+import repository
+import rendering
+from ratelimit import TokenBucket
+from records import CommunityRecord, INDEX_PROJECTION
+from search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+USER_PROJECTION = {"telegramId": 1, "searchHistory.query": 1}
+
+def run_id(now):
+    """One run per ISO week, e.g. "2026-W42" """
+    year, week, _ = now.isocalendar()
+    return f"{year}-W{week:02d}"
+
+class DigestBuilder:
+    """Matches interest profiles against the new communities and renders each profile once"""
+
+    def __init__(self, communities, max_communities=config.DIGEST_MAX_COMMUNITIES):
+        self.max_communities = max_communities
+        self.communities = []
+        self.terms = {}  # term -> indexes of the communities it matches
+        for document in communities:
+            index = len(self.communities)
+            self.communities.append(CommunityRecord.from_document(document))
+            texts = [document.get("category") or "", document.get("name") or ""] + list(document.get("keywords") or [])
+            for term in {term for text in texts for term in tokenize(text)}:
+                self.terms.setdefault(term, []).append(index)
+        self._rendered = {}  # profile -> (text, reply_markup) or None
+        self.renders = 0
+
+    def profile(self, user):
+        """Search terms of the user that match a new community, as a hashable key"""
+        return frozenset(
+            term
+            for entry in user.get("searchHistory") or []
+            for term in tokenize(entry.get("query") or "")
+            if term in self.terms
+        )
+
+    def _render(self, profile):
+        matches = {}
+        for term in profile:
+            for index in self.terms[term]:
+                matches[index] = matches.get(index, 0) + 1
+        # Most matched terms first, then most popular
+        ranked = sorted(matches, key=lambda index: (-matches[index], -(self.communities[index].score or 0)))
+        self.renders += 1
+        return rendering.digest_message([self.communities[index] for index in ranked[:self.max_communities]])
+
+    def message(self, user):
+        """(text, reply_markup) for a user, or None when nothing new matches their interests"""
+        profile = self.profile(user)
+        if not profile:
+            return None
+        if profile not in self._rendered:
+            self._rendered[profile] = self._render(profile)
+        return self._rendered[profile]
+
+class DigestSender:
+    """Rate-paced worker pool sending queued digests"""
+
+    def __init__(self, bot, concurrency=config.DIGEST_CONCURRENCY, rate=config.DIGEST_RATE):
+        self.bot = bot
+        self.bucket = TokenBucket(rate, capacity=1)
+        self.queue = asyncio.Queue(maxsize=concurrency * 4)
+        self.workers = [asyncio.create_task(self._work()) for _ in range(concurrency)]
+        self.sent = 0
+        self.blocked = 0
+        self.failed = 0
+
+    async def _work(self):
+        while True:
+            chat_id, (text, reply_markup) = await self.queue.get()
+            try:
+                await self.bucket.acquire()
+                await self.bot.send_message(
+                    chat_id=chat_id, text=text, parse_mode=rendering.PARSE_MODE, reply_markup=reply_markup
+                )
+                self.sent += 1
+            except Forbidden:
+                # The user blocked the bot
+                self.blocked += 1
+            except BadRequest as e:
+                logger.warning(f"Digest to {chat_id} rejected: {e}")
+                self.failed += 1
+            except Exception as e:
+                logger.error(f"Digest to {chat_id} failed: {e}")
+                self.failed += 1
+            finally:
+                self.queue.task_done()
+
+    async def put(self, chat_id, message):
+        await self.queue.put((chat_id, message))
+
+    async def close(self):
+        """Wait for queued digests to be sent and stop the workers"""
+        await self.queue.join()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+
+def _load_new_communities(since):
+    return list(database.communities.find({"approved": True, "approvedAt": {"$gte": since}}, INDEX_PROJECTION))
+
+def _start_run(run, now):
+    """The run's checkpoint document, created on first use"""
+    return database.digest_runs.find_one_and_update(
+        {"_id": run},
+        {"$setOnInsert": {"startedAt": now, "lastUserId": None, "sent": 0, "blocked": 0, "failed": 0}},
+        upsert=True,
+        return_document=True
+    )
+
+def _user_cursor(after, batch_size):
+    query = {"searchHistory.0": {"$exists": True}}
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    return database.users.find(query, USER_PROJECTION).sort("_id", 1).batch_size(batch_size)
+
+def _claim(run, previous, after, counts):
+    """Move the checkpoint from previous to after; None if another runner moved it first"""
+    return database.digest_runs.find_one_and_update(
+        {"_id": run, "lastUserId": previous, "finishedAt": {"$exists": False}},
+        {"$set": {"lastUserId": after}, "$inc": counts}
+    )
+
+def _add_counts(run, counts, finished_at=None):
+    update = {"$inc": counts}
+    if finished_at is not None:
+        update["$set"] = {"finishedAt": finished_at}
+    database.digest_runs.update_one({"_id": run}, update)
+
+async def send_digests(bot, now=None, batch_size=config.DIGEST_BATCH_SIZE):
+    """Send this week's digest to every matching user not reached yet; returns a summary dict"""
+    now = now or datetime.now(timezone.utc)
+    run = run_id(now)
+    state = await repository.run(_start_run, run, now)
+    if state.get("finishedAt"):
+        logger.info(f"Digest {run} was already sent")
+        return {"run": run, "sent": 0, "skipped": True}
+
+    since = now - timedelta(days=config.DIGEST_LOOKBACK_DAYS)
+    builder = DigestBuilder(await repository.run(_load_new_communities, since))
+    if not builder.communities:
+        await repository.run(database.digest_runs.update_one, {"_id": run}, {"$set": {"finishedAt": now}})
+        logger.info(f"Digest {run}: no new communities")
+        return {"run": run, "sent": 0, "skipped": False}
+
+    sender = DigestSender(bot)
+    reported = {"sent": 0, "blocked": 0, "failed": 0}
+    def counts():
+        return {"sent": sender.sent, "blocked": sender.blocked, "failed": sender.failed}
+    def unreported(current):
+        """Counts since the last write, added with $inc so concurrent runners sum up"""
+        return {key: current[key] - reported[key] for key in current}
+
+    started = time.perf_counter()
+    previous = state.get("lastUserId")
+    cursor = _user_cursor(previous, batch_size)
+    users = queued = 0
+    finished = False
+    try:
+        while True:
+            # One cursor batch at a time; the bounded queue keeps the cursor from racing ahead
+            batch = await repository.run(lambda: list(itertools.islice(cursor, batch_size)))
+            if not batch:
+                finished = True
+                break
+            after = batch[-1]["_id"]
+            # Claimed before sending: an interrupted batch is skipped on resume, never resent
+            current = counts()
+            if await repository.run(_claim, run, previous, after, unreported(current)) is None:
+                # Another runner claimed this range: continue after its checkpoint
+                state = await repository.run(database.digest_runs.find_one, {"_id": run})
+                if state.get("finishedAt"):
+                    break
+                previous = state.get("lastUserId")
+                cursor.close()
+                cursor = _user_cursor(previous, batch_size)
+                continue
+            previous = after
+            reported.update(current)
+
+            for user in batch:
+                users += 1
+                message = builder.message(user)
+                if message is not None:
+                    queued += 1
+                    await sender.put(user["telegramId"], message)
+    finally:
+        cursor.close()
+        # Queued digests are still delivered when the run is interrupted
+        await sender.close()
+        await repository.run(
+            _add_counts, run, unreported(counts()), datetime.now(timezone.utc) if finished else None
+        )
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "run": run,
+        "sent": sender.sent,
+        "blocked": sender.blocked,
+        "failed": sender.failed,
+        "users": users,
+        "renders": builder.renders,
+        "seconds": round(elapsed, 1),
+        "messages_per_second": round(sender.sent / elapsed, 1) if elapsed else 0.0
+    }
+    logger.info(
+        f"Digest {run}: {sender.sent} sent, {sender.blocked} blocked, {sender.failed} failed "
+        f"to {queued} of {users} users ({builder.renders} digests rendered) in {elapsed:.1f}s, "
+        f"{summary['messages_per_second']} msgs/sec"
+    )
+    return summary
+
+# One digest run per process at a time; other processes share it through the checkpoint
+_lock = asyncio.Lock()
+
+def _unfinished_run(run):
+    return database.digest_runs.find_one({"_id": run, "finishedAt": {"$exists": False}}, {"_id": 1})
+
+async def digest_job(context):
+    """JobQueue callback for the weekly digest"""
+    try:
+        async with _lock:
+            await send_digests(context.bot)
+    except Exception as e:
+        logger.error(f"Digest error: {e}")
+
+async def resume_job(context):
+    """JobQueue callback: finish this week's run if it was started but interrupted"""
+    if _lock.locked():
+        return
+    try:
+        if await repository.run(_unfinished_run, run_id(datetime.now(timezone.utc))) is None:
+            return
+        async with _lock:
+            logger.info("Resuming an unfinished digest run")
+            await send_digests(context.bot)
+    except Exception as e:
+        logger.error(f"Digest resume error: {e}")
+
+async def main():
+    from telegram.ext import ExtBot
+    from ratelimit import TelegramRateLimiter
+
+    async with ExtBot(config.BOT_TOKEN, rate_limiter=TelegramRateLimiter()) as bot:
+        print(await send_digests(bot))
+    repository.shutdown()
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    asyncio.run(main())
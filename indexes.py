@@ -0,0 +1,207 @@
+"""
+Index management.
+- Declares the indexes the handlers' queries rely on
+- Creates missing ones idempotently at startup and reconciles changed options (e.g. TTLs)
+- Rebuilds the text index only when its definition changed
+- Uses explain() to report handler queries that are not served by an index
+
+Run `python indexes.py` to create missing indexes and print the explain report.
+"""
+
+import logging
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT
+from pymongo.errors import OperationFailure
+import config
+import pagination
+
+logger = logging.getLogger(__name__)
+
+# collection -> list of (name, keys, options)
+REQUIRED_INDEXES = {
+    "communities": [
+        # Category browsing, sorted like pagination.BROWSE_SORT
+        ("approved_category_browse", [
+            ("approved", ASCENDING), ("category", ASCENDING),
+            (pagination.SORT_FIELD, DESCENDING), ("_id", DESCENDING)
+        ], {}),
+        # Location browsing, one index per branch of the location $or
+        ("approved_city_browse", [
+            ("approved", ASCENDING), ("location.city", ASCENDING),
+            (pagination.SORT_FIELD, DESCENDING), ("_id", DESCENDING)
+        ], {}),
+        ("approved_location_browse", [
+            ("approved", ASCENDING), ("location", ASCENDING),
+            (pagination.SORT_FIELD, DESCENDING), ("_id", DESCENDING)
+        ], {}),
+        # Member count refresher: stalest first, then most popular
+        ("approved_membersUpdatedAt_score", [
+            ("approved", ASCENDING), ("membersUpdatedAt", ASCENDING), ("score", DESCENDING)
+        ], {}),
+        # Communities approved since the last weekly digest (digest.py)
+        ("approved_approvedAt", [("approved", ASCENDING), ("approvedAt", ASCENDING)], {}),
+        # One listing per canonical link (dedup.py); also keys bulk_io.py upserts
+        ("linkKey_unique", [("linkKey", ASCENDING)],
+         {"unique": True, "partialFilterExpression": {"linkKey": {"$type": "string"}}}),
+        # LSH bands of the name/description MinHash, for near-duplicate lookups
+        ("lshBands", [("lshBands", ASCENDING)], {}),
+    ],
+    "pending_submissions": [
+        # Duplicate checks at submission time look up pending links and LSH bands too
+        ("linkKey_unique", [("linkKey", ASCENDING)],
+         {"unique": True, "partialFilterExpression": {"linkKey": {"$type": "string"}}}),
+        ("lshBands", [("lshBands", ASCENDING)], {}),
+    ],
+    "users": [
+        ("telegramId_unique", [("telegramId", ASCENDING)], {"unique": True}),
+    ],
+    "analytics": [
+        # Hourly event buckets written by metrics.py and read by popularity.py
+        ("communityId_bucket_unique", [("communityId", ASCENDING), ("bucket", ASCENDING)], {"unique": True}),
+        ("bucket_ttl", [("bucket", ASCENDING)],
+         {"expireAfterSeconds": config.POPULARITY_WINDOW_DAYS * 24 * 3600}),
+    ],
+}
+
+# Text index used by $text search; a collection can only have one
+TEXT_INDEX_NAME = "name_text_description_text_keywords_text"
+TEXT_INDEX_KEYS = [("name", TEXT), ("description", TEXT), ("keywords", TEXT)]
+# Documents use "language" for display ("amharic", "both"), which MongoDB would otherwise
+# read as the per-document stemming language and reject as unsupported
+TEXT_INDEX_OPTIONS = {"default_language": "none", "language_override": "textLanguage"}
+
+def _text_index_matches(info, name, weights, options):
+    """Compare an existing text index against the desired definition"""
+    return (
+        info.get("name") == name
+        and info.get("weights") == weights
+        and all(info.get(option) == value for option, value in options.items())
+    )
+
+def reconcile_text_index(collection, keys=TEXT_INDEX_KEYS, name=TEXT_INDEX_NAME, options=TEXT_INDEX_OPTIONS,
+                         weights=None):
+    """
+    Make sure the collection's text index matches the desired definition.
+    Returns "unchanged", "created" or "rebuilt".
+    """
+    desired_weights = weights or {field: 1 for field, _ in keys}
+
+    existing = None
+    for index_name, info in collection.index_information().items():
+        if any(direction == TEXT for _, direction in info["key"]):
+            existing = dict(info, name=index_name)
+            break
+
+    if existing is not None and _text_index_matches(existing, name, desired_weights, options):
+        return "unchanged"
+
+    if existing is not None:
+        # Only one text index is allowed, so a changed definition needs a drop first
+        logger.info(f"Text index {existing['name']} differs from the desired definition, rebuilding")
+        collection.drop_index(existing["name"])
+
+    create_options = dict(options)
+    if weights:
+        create_options["weights"] = weights
+    # Servers before 4.2 would otherwise block the collection during the build
+    collection.create_index(keys, name=name, background=True, **create_options)
+    logger.info(f"Created text index {name}")
+    return "created" if existing is None else "rebuilt"
+
+def handler_queries():
+    """Representative (name, collection, filter, sort) shapes of the handlers' queries"""
+    cursor = (0, ObjectId())
+    queries = []
+    for kind, key in (("c", "tech"), ("l", "Addis Ababa")):
+        label = "category" if kind == "c" else "location"
+        base = pagination.browse_filter(kind, key)
+        queries.append((f"{label} count", "communities", base, None))
+        for direction in (None, pagination.NEXT, pagination.PREV):
+            query, sort = pagination.keyset_query(base, cursor if direction else None, direction or pagination.NEXT)
+            page = "first page" if direction is None else f"page ({direction})"
+            queries.append((f"{label} {page}", "communities", query, sort))
+    queries.append(("user lookup", "users", {"telegramId": 0}, None))
+    return queries
+
+def _options_differ(info, options):
+    return any(info.get(option) != value for option, value in options.items())
+
+def ensure_indexes(db):
+    """Create any declared index that does not exist yet and reconcile changed options; returns names changed"""
+    changed = []
+    for collection_name, declared in REQUIRED_INDEXES.items():
+        collection = db[collection_name]
+        existing = {tuple(info["key"]): dict(info, name=name) for name, info in collection.index_information().items()}
+
+        for name, keys, options in declared:
+            info = existing.get(tuple(keys))
+            if info is not None and not _options_differ(info, options):
+                continue
+            try:
+                if info is not None and set(options) == {"expireAfterSeconds"}:
+                    # e.g. POPULARITY_WINDOW_DAYS changed: a TTL can be changed in place
+                    db.command("collMod", collection_name, index={
+                        "name": info["name"], "expireAfterSeconds": options["expireAfterSeconds"]
+                    })
+                    logger.info(f"Updated TTL of index {collection_name}.{info['name']}")
+                elif info is not None:
+                    logger.info(f"Index {collection_name}.{info['name']} differs from the desired options, rebuilding")
+                    collection.drop_index(info["name"])
+                    collection.create_index(keys, name=name, **options)
+                else:
+                    collection.create_index(keys, name=name, **options)
+                    logger.info(f"Created index {collection_name}.{name}")
+                changed.append(name)
+            except OperationFailure as e:
+                # e.g. duplicate telegramId values prevent the unique index
+                logger.error(f"Could not create index {collection_name}.{name}: {e}")
+    return changed
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree"""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for child_key in ("inputStage", "queryPlan"):
+        yield from _plan_stages(plan.get(child_key))
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+def explain_report(db):
+    """
+    Explain every handler query shape.
+    Returns a list of (name, problem) for queries that scan the collection or sort in memory.
+    """
+    problems = []
+    for name, collection_name, query, sort in handler_queries():
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        except OperationFailure as e:
+            problems.append((name, f"explain failed: {e}"))
+            continue
+
+        stages = set(_plan_stages(plan))
+        if "COLLSCAN" in stages:
+            problems.append((name, "collection scan"))
+        elif "SORT" in stages:
+            problems.append((name, "in-memory sort"))
+    return problems
+
+def log_explain_report(db):
+    problems = explain_report(db)
+    for name, problem in problems:
+        logger.warning(f"Query '{name}' is not index-covered: {problem}")
+    if not problems:
+        logger.info("All handler queries are served by indexes")
+    return problems
+
+if __name__ == "__main__":
+    from database import db
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    ensure_indexes(db)
+    log_explain_report(db)
@@ -0,0 +1,227 @@
+"""
+Hot-path instrumentation.
+- Every registered handler is wrapped to record a latency histogram and the
+  number of MongoDB commands and Telegram API calls made while handling the update
+- MongoDB commands are counted by a pymongo CommandListener and attributed to the
+  current update through a context variable (repository.run copies it to its threads)
+- Telegram calls are counted by the rate limiter, which sees every Bot API request
+- Served in Prometheus text format on METRICS_PORT and logged periodically
+"""
+
+import asyncio
+import bisect
+import contextvars
+import functools
+import logging
+import time
+from collections import Counter, defaultdict
+from pymongo import monitoring
+import config
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21)
+
+# Counter of "db"/"telegram" calls for the update being handled
+_update_counts = contextvars.ContextVar("update_counts", default=None)
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside its bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            cumulative += bucket_count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+class Registry:
+    """Per-handler histograms and counters plus externally supplied gauges"""
+
+    def __init__(self):
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.db_ops = defaultdict(lambda: Histogram(COUNT_BUCKETS))
+        self.telegram_calls = defaultdict(lambda: Histogram(COUNT_BUCKETS))
+        self.errors = Counter()
+        self.db_commands = Counter()  # command name -> count, across all callers
+        self.telegram_endpoints = Counter()
+        self._gauges = {}  # name -> callable returning {label: value}
+
+    def add_gauges(self, name, collect):
+        """Expose the dict returned by collect() as gauge <name>{key="..."}"""
+        self._gauges[name] = collect
+
+    def record_update(self, handler, seconds, counts, failed):
+        self.latency[handler].observe(seconds)
+        self.db_ops[handler].observe(counts["db"])
+        self.telegram_calls[handler].observe(counts["telegram"])
+        if failed:
+            self.errors[handler] += 1
+
+    def gauges(self):
+        values = {}
+        for name, collect in self._gauges.items():
+            try:
+                values[name] = collect()
+            except Exception as e:
+                logger.error(f"Instrumentation gauge {name} failed: {e}")
+        return values
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric, histograms, kind in (
+            ("bot_handler_latency_seconds", self.latency, "histogram"),
+            ("bot_handler_db_operations", self.db_ops, "histogram"),
+            ("bot_handler_telegram_calls", self.telegram_calls, "histogram"),
+        ):
+            lines.append(f"# TYPE {metric} {kind}")
+            for handler, histogram in sorted(histograms.items()):
+                lines.extend(histogram.samples(metric, f'handler="{handler}"'))
+
+        lines.append("# TYPE bot_handler_errors_total counter")
+        lines.extend(f'bot_handler_errors_total{{handler="{handler}"}} {count}' for handler, count in sorted(self.errors.items()))
+        lines.append("# TYPE bot_mongodb_commands_total counter")
+        lines.extend(f'bot_mongodb_commands_total{{command="{name}"}} {count}' for name, count in sorted(self.db_commands.items()))
+        lines.append("# TYPE bot_telegram_requests_total counter")
+        lines.extend(f'bot_telegram_requests_total{{endpoint="{name}"}} {count}' for name, count in sorted(self.telegram_endpoints.items()))
+
+        for name, values in sorted(self.gauges().items()):
+            lines.append(f"# TYPE bot_{name} gauge")
+            lines.extend(f'bot_{name}{{key="{key}"}} {value}' for key, value in sorted(values.items()))
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """One line per handler for the periodic log"""
+        lines = []
+        for handler, histogram in sorted(self.latency.items()):
+            db_ops = self.db_ops[handler]
+            telegram_calls = self.telegram_calls[handler]
+            lines.append(
+                f"{handler}: {histogram.count} updates, p50 {histogram.quantile(0.5) * 1000:.0f}ms, "
+                f"p95 {histogram.quantile(0.95) * 1000:.0f}ms, p99 {histogram.quantile(0.99) * 1000:.0f}ms, "
+                f"{db_ops.sum / db_ops.count:.1f} db ops, {telegram_calls.sum / telegram_calls.count:.1f} telegram calls, "
+                f"{self.errors[handler]} errors"
+            )
+        return lines
+
+registry = Registry()
+
+def _count(kind):
+    counts = _update_counts.get()
+    if counts is not None:
+        counts[kind] += 1
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts MongoDB commands, globally and for the update being handled"""
+
+    def started(self, event):
+        registry.db_commands[event.command_name] += 1
+        # getMore belongs to a cursor that was already counted
+        if event.command_name != "getMore":
+            _count("db")
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+command_listener = CommandCounter()
+
+def record_telegram_call(endpoint):
+    """Called by the rate limiter for every Bot API request"""
+    registry.telegram_endpoints[endpoint] += 1
+    _count("telegram")
+
+def instrument(callback, name=None):
+    """Wrap a handler callback to record latency and per-update DB/Telegram call counts"""
+    name = name or callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        counts = Counter()
+        token = _update_counts.set(counts)
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await callback(update, context)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            registry.record_update(name, time.perf_counter() - started, counts, failed)
+            _update_counts.reset(token)
+
+    return wrapper
+
+def instrument_application(application):
+    """Instrument every handler registered on the application"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = instrument(handler.callback)
+
+async def _serve(reader, writer):
+    try:
+        request_line = await reader.readline()
+        # Skip the request headers
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+
+        parts = request_line.split()
+        if len(parts) >= 2 and parts[1] == b"/metrics":
+            status, body = "200 OK", registry.render().encode()
+        else:
+            status, body = "404 Not Found", b"Not found\n"
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.error(f"Metrics endpoint error: {e}")
+    finally:
+        writer.close()
+
+async def start_metrics_server(host=config.METRICS_HOST, port=config.METRICS_PORT):
+    """Serve GET /metrics; returns the server, or None when METRICS_PORT is 0"""
+    if not port:
+        return None
+    server = await asyncio.start_server(_serve, host, port)
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+async def log_summary_job(context):
+    """JobQueue callback: log per-handler latency/DB/Telegram figures and cache hit ratios"""
+    for line in registry.summary():
+        logger.info(line)
+    for name, values in registry.gauges().items():
+        logger.info(f"{name}: {values}")
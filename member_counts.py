@@ -0,0 +1,93 @@
+"""
+Background refresh of community member counts.
+- Picks approved communities whose count is missing or older than
+  MEMBER_REFRESH_MAX_AGE_HOURS, never-refreshed and most popular first
+- Calls get_chat_member_count for public @usernames with bounded concurrency,
+  paced by its own token bucket so interactive replies keep most of the rate limit
+- Writes the results back in batched unordered bulk_write calls
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
+from telegram.error import BadRequest, Forbidden
+import config
+import dedup
+import repository
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+def public_username(link):
+    """@username of a public t.me link (web previews and message links included), or None for invite links"""
+    canonical = dedup.canonical_link(link)
+    if not canonical:
+        return None
+    path = canonical[len("https://t.me/"):].split("/")[0]
+    if not path or path.startswith("+") or path in ("joinchat", "c", "s"):
+        return None
+    return f"@{path}"
+
+async def _fetch_count(bot, username, bucket, semaphore):
+    async with semaphore:
+        await bucket.acquire()
+        return await bot.get_chat_member_count(chat_id=username)
+
+async def refresh_member_counts(bot, now=None, limit=config.MEMBER_REFRESH_BATCH,
+                                concurrency=config.MEMBER_REFRESH_CONCURRENCY, rate=config.MEMBER_REFRESH_RATE):
+    """Refresh up to `limit` stale member counts; returns (updated, failed)"""
+    now = now or datetime.now(timezone.utc)
+    candidates = await repository.find_member_refresh_candidates(
+        now - timedelta(hours=config.MEMBER_REFRESH_MAX_AGE_HOURS), limit
+    )
+
+    bucket = TokenBucket(rate, capacity=1)
+    semaphore = asyncio.Semaphore(concurrency)
+    ops = []
+    updated = failed = 0
+
+    async def refresh(community):
+        nonlocal updated, failed
+        username = public_username(community.get("link"))
+        fields = {"membersUpdatedAt": now}
+        try:
+            if username is None:
+                # Invite links cannot be looked up; only remember that we tried
+                fields["membersError"] = "private link"
+            else:
+                fields["members"] = await _fetch_count(bot, username, bucket, semaphore)
+                updated += 1
+        except (BadRequest, Forbidden) as e:
+            # Deleted, renamed or private chats: back off until the count is stale again
+            fields["membersError"] = str(e)
+            failed += 1
+        except Exception as e:
+            # Network trouble etc.: leave it for the next run
+            logger.warning(f"Member count refresh failed for {username}: {e}")
+            failed += 1
+            return
+
+        update = {"$set": fields}
+        if "members" in fields:
+            update["$unset"] = {"membersError": ""}
+        ops.append(UpdateOne({"_id": community["_id"]}, update))
+
+    for start in range(0, len(candidates), config.MEMBER_REFRESH_WRITE_BATCH):
+        chunk = candidates[start:start + config.MEMBER_REFRESH_WRITE_BATCH]
+        await asyncio.gather(*(refresh(community) for community in chunk))
+        if ops:
+            await repository.bulk_write_communities(ops)
+            ops = []
+
+    return updated, failed
+
+async def refresh_job(context):
+    """JobQueue callback for the periodic member count refresh"""
+    try:
+        updated, failed = await refresh_member_counts(context.bot)
+    except Exception as e:
+        logger.error(f"Member count refresh error: {e}")
+        return
+    if updated or failed:
+        logger.info(f"Member counts refreshed for {updated} communities ({failed} failed)")
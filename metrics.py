@@ -0,0 +1,170 @@
+"""
+In-process aggregation of community metrics counters.
+- searchHits/clicks increments are accumulated in memory
+- A periodic job flushes them with a single unordered bulk_write, and records
+  the same increments as hourly event buckets in analytics (for popularity.py)
+- Pending counters are bounded; the backlog is flushed early when full, and
+  increments for new communities are dropped (and counted) while it stays full
+- After a failed flush, early flushes back off so a MongoDB outage is not hammered
+- Workers in multi-process mode spool counters to the shared store instead,
+  and the ingress process drains them into MongoDB
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+import config
+import repository
+import shared
+
+logger = logging.getLogger(__name__)
+
+def build_counter_ops(pending):
+    """$inc ops on communities.metrics for {community_id: {field: amount}}"""
+    return [
+        UpdateOne(
+            {"_id": community_id},
+            {"$inc": {f"metrics.{field}": amount for field, amount in fields.items()}}
+        )
+        for community_id, fields in pending.items()
+    ]
+
+def current_bucket(now=None):
+    """Start of the hour that event counts are recorded under"""
+    now = now or datetime.now(timezone.utc)
+    return now.replace(minute=0, second=0, microsecond=0)
+
+def build_event_ops(pending, bucket):
+    """Upserts adding the increments to each community's event bucket in analytics"""
+    return [
+        UpdateOne(
+            {"communityId": community_id, "bucket": bucket},
+            {"$inc": dict(fields)},
+            upsert=True
+        )
+        for community_id, fields in pending.items()
+    ]
+
+async def write_pending(pending):
+    """Apply increments to the communities' counters and to the hourly event buckets"""
+    await repository.bulk_write_communities(build_counter_ops(pending))
+    try:
+        await repository.bulk_write_analytics(build_event_ops(pending, current_bucket()))
+    except Exception as e:
+        # Counters are already written; retrying would count them twice, so events are best effort
+        logger.error(f"Metrics event bucket write error: {e}")
+
+class MetricsAggregator:
+    """Coalesces $inc updates on communities.metrics.* into batched writes"""
+
+    def __init__(self, max_pending=config.METRICS_MAX_PENDING):
+        self.max_pending = max_pending
+        self._pending = defaultdict(lambda: defaultdict(int))
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self.dropped = 0
+        self._retry_delay = 0.0
+        self._retry_at = 0.0  # no early flush before this (monotonic) time
+
+    def __len__(self):
+        return len(self._pending)
+
+    def record(self, community_id, field, amount=1):
+        """Count `amount` towards metrics.<field> of a community (non-blocking)"""
+        if community_id not in self._pending and len(self._pending) >= self.max_pending:
+            # Backlog is full (e.g. MongoDB is down): drop rather than grow without bound
+            self.dropped += amount
+            self._schedule_flush()
+            return
+        self._pending[community_id][field] += amount
+
+        # Backlog is full: flush early
+        if len(self._pending) >= self.max_pending:
+            self._schedule_flush()
+
+    def record_many(self, community_ids, field):
+        """Count one increment of metrics.<field> for each community"""
+        for community_id in community_ids:
+            self.record(community_id, field)
+
+    def _schedule_flush(self):
+        if time.monotonic() < self._retry_at:
+            return
+        if self._flush_task is None or self._flush_task.done():
+            try:
+                self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+            except RuntimeError:
+                # No running loop (e.g. during shutdown); the next flush picks it up
+                pass
+
+    def _restore(self, pending):
+        """Merge a failed batch back in, dropping what exceeds the bound"""
+        for community_id, fields in pending.items():
+            if community_id not in self._pending and len(self._pending) >= self.max_pending:
+                self.dropped += sum(fields.values())
+                continue
+            for field, amount in fields.items():
+                self._pending[community_id][field] += amount
+
+    async def _write(self, pending):
+        await write_pending(pending)
+
+    async def flush(self):
+        """Write all pending increments in batched writes; returns the number of communities"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            # Swap the buffer so new increments keep accumulating during the write
+            pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+
+            try:
+                await self._write(pending)
+            except Exception as e:
+                logger.error(f"Metrics flush error: {e}")
+                self._restore(pending)
+                # Double the pause before the next early flush, up to one flush interval
+                self._retry_delay = min(max(self._retry_delay * 2, 1.0), config.METRICS_FLUSH_INTERVAL)
+                self._retry_at = time.monotonic() + self._retry_delay
+                if self.dropped:
+                    logger.warning(f"Metrics backlog full, dropped {self.dropped} increments so far")
+                return 0
+
+            self._retry_delay = 0.0
+            self._retry_at = 0.0
+            return len(pending)
+
+class SpoolingMetricsAggregator(MetricsAggregator):
+    """Aggregator for worker processes: flushes into the shared counters spool"""
+
+    def __init__(self, counters, max_pending=config.METRICS_MAX_PENDING):
+        super().__init__(max_pending)
+        self.counters = counters
+
+    async def _write(self, pending):
+        await repository.run(self.counters.add, pending)
+
+async def drain_shared_counters(counters):
+    """Move spooled worker counters into MongoDB"""
+    pending = await repository.run(counters.drain)
+    if not pending:
+        return 0
+    try:
+        await write_pending(pending)
+    except Exception:
+        # Put them back so the next drain retries
+        await repository.run(counters.add, pending)
+        raise
+    return len(pending)
+
+if config.SCALE_ROLE == "worker" and shared.store:
+    aggregator = SpoolingMetricsAggregator(shared.SharedCounters(shared.store))
+else:
+    aggregator = MetricsAggregator()
+
+async def flush_job(context):
+    """JobQueue callback for the periodic flush"""
+    await aggregator.flush()
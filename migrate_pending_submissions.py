@@ -0,0 +1,10 @@
+"""
+One-off migration: move unapproved submissions from communities to pending_submissions
+Usage: python migrate_pending_submissions.py
+"""
+
+from database import migrate_pending_submissions
+
+if __name__ == "__main__":
+    moved = migrate_pending_submissions()
+    print(f"Moved {moved} unapproved submissions to pending_submissions")
@@ -0,0 +1,79 @@
+"""
+Keyset pagination for browsing communities.
+- Pages are range queries on (score, _id), never skip()
+- Page state is encoded in callback_data, which Telegram caps at 64 bytes
+"""
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+CALLBACK_PREFIX = "page"
+MAX_CALLBACK_BYTES = 64
+
+# Sort order for browse views: highest popularity score first, newest first on ties
+SORT_FIELD = "score"
+BROWSE_SORT = [(SORT_FIELD, -1), ("_id", -1)]
+
+NEXT = "n"
+PREV = "p"
+
+def browse_filter(kind, key):
+    """Filter for approved communities in a category ("c") or city ("l")"""
+    if kind == "c":
+        return {"category": key, "approved": True}
+    # Support both location formats
+    return {
+        "$or": [
+            {"location": key},
+            {"location.city": key}
+        ],
+        "approved": True
+    }
+
+def encode(kind, key, direction, community):
+    """Callback data for the page after (NEXT) or before (PREV) a CommunityRecord"""
+    data = "_".join([
+        CALLBACK_PREFIX,
+        kind,
+        key,
+        direction,
+        repr(float(getattr(community, SORT_FIELD))),
+        str(community.id)
+    ])
+    if len(data.encode("utf-8")) > MAX_CALLBACK_BYTES:
+        raise ValueError(f"Callback data too long: {data}")
+    return data
+
+def decode(data):
+    """Parse callback data into (kind, key, direction, cursor); cursor is (value, ObjectId)"""
+    prefix, kind, key, direction, value, community_id = data.split("_")
+    if prefix != CALLBACK_PREFIX or direction not in (NEXT, PREV):
+        raise ValueError(f"Not a page callback: {data}")
+    try:
+        community_id = ObjectId(community_id)
+    except InvalidId:
+        raise ValueError(f"Invalid community id in page callback: {data}")
+    return kind, key, direction, (float(value), community_id)
+
+def keyset_query(base_filter, cursor=None, direction=NEXT):
+    """Filter and sort for one page starting after/before `cursor`"""
+    if cursor is None:
+        return dict(base_filter), BROWSE_SORT
+
+    value, community_id = cursor
+    if direction == NEXT:
+        comparison, sort = "$lt", BROWSE_SORT
+    else:
+        # Walk backwards from the cursor; the caller reverses the results
+        comparison, sort = "$gt", [(field, -order) for field, order in BROWSE_SORT]
+
+    query = {
+        "$and": [
+            base_filter,
+            {"$or": [
+                {SORT_FIELD: {comparison: value}},
+                {SORT_FIELD: value, "_id": {comparison: community_id}}
+            ]}
+        ]
+    }
+    return query, sort
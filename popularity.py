@@ -0,0 +1,81 @@
+"""
+Offline popularity scores.
+- Aggregates the hourly searchHits/clicks buckets in analytics with exponential decay
+- score = log10(1 + members) + log1p(decayed engagement), stored on each approved
+  community and indexed, so browse and search rank with a single indexed query
+"""
+
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
+import config
+import database
+import repository
+
+logger = logging.getLogger(__name__)
+
+def decay_expression(now, half_life_hours):
+    """Aggregation expression: 0.5 ** (age of the bucket in half-lives)"""
+    return {"$pow": [0.5, {"$divide": [
+        {"$subtract": [now, "$bucket"]},
+        half_life_hours * 3600 * 1000
+    ]}]}
+
+def engagement_pipeline(now, window_days=config.POPULARITY_WINDOW_DAYS,
+                        half_life_hours=config.POPULARITY_HALF_LIFE_HOURS):
+    """Per-community decayed engagement over the event buckets of the last window_days"""
+    weighted = {"$add": [
+        {"$multiply": [config.CLICK_WEIGHT, {"$ifNull": ["$clicks", 0]}]},
+        {"$multiply": [config.SEARCH_HIT_WEIGHT, {"$ifNull": ["$searchHits", 0]}]}
+    ]}
+    return [
+        {"$match": {"bucket": {"$gte": now - timedelta(days=window_days)}}},
+        {"$group": {
+            "_id": "$communityId",
+            "popularity": {"$sum": {"$multiply": [weighted, decay_expression(now, half_life_hours)]}}
+        }}
+    ]
+
+def compute_score(members, engagement):
+    return round(math.log10(1 + (members or 0)) + math.log1p(engagement), 4)
+
+def compute_scores(now=None):
+    """Recompute scores for all approved communities; returns {community_id: score} of those that changed"""
+    now = now or datetime.now(timezone.utc)
+    engagement = {
+        row["_id"]: row for row in database.analytics.aggregate(engagement_pipeline(now))
+    }
+
+    ops = []
+    changed = {}
+    cursor = database.communities.find({"approved": True}, {"members": 1, "score": 1}).batch_size(1000)
+    for community in cursor:
+        events = engagement.get(community["_id"], {})
+        score = compute_score(community.get("members"), events.get("popularity", 0))
+
+        # Only write scores that moved, to keep the update (and change stream) volume down
+        if community.get("score") == score:
+            continue
+        ops.append(UpdateOne({"_id": community["_id"]}, {"$set": {"score": score}}))
+        changed[community["_id"]] = score
+
+        if len(ops) >= 1000:
+            database.communities.bulk_write(ops, ordered=False)
+            ops = []
+
+    if ops:
+        database.communities.bulk_write(ops, ordered=False)
+    return changed
+
+async def refresh_scores_job(context):
+    """JobQueue callback: recompute scores, then move them into the in-memory views that rank by them"""
+    try:
+        changed = await repository.run(compute_scores)
+    except Exception as e:
+        logger.error(f"Popularity score error: {e}")
+        return
+
+    logger.info(f"Popularity scores updated for {len(changed)} communities")
+    if changed:
+        await repository.scores_changed(changed)
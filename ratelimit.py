@@ -0,0 +1,154 @@
+"""
+Outbound Telegram rate limiting.
+- Global and per-chat token buckets keep sends under Telegram's flood limits
+- RetryAfter errors pause sending and the request is retried with backoff
+- Queue depth and retry counters are exposed through stats()
+"""
+
+import asyncio
+import logging
+import time
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+import config
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Answering callback/inline queries must be fast and does not count as sending a message
+UNTHROTTLED_ENDPOINTS = {"answerCallbackQuery", "answerInlineQuery"}
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second with bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def is_idle(self):
+        """True when the bucket is full and nobody is waiting on it"""
+        self._refill()
+        return self.tokens >= self.capacity and not self._lock.locked()
+
+    async def acquire(self):
+        # The lock is FIFO, so waiters are served in arrival order
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+class TelegramRateLimiter(BaseRateLimiter):
+    """Token bucket rate limiter plugged into ApplicationBuilder.rate_limiter()"""
+
+    def __init__(self, global_rate=config.TELEGRAM_GLOBAL_RATE, chat_rate=config.TELEGRAM_CHAT_RATE,
+                 chat_burst=config.TELEGRAM_CHAT_BURST, group_rate=config.TELEGRAM_GROUP_RATE,
+                 max_retries=config.TELEGRAM_MAX_RETRIES):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, capacity=global_rate)
+        self._chats = {}
+        self._paused_until = 0.0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.in_flight = 0
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self._chats.clear()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= 10000:
+                self._prune()
+            # Negative ids are groups/channels, which have a lower per-minute limit
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = TokenBucket(self.group_rate, capacity=self.chat_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, capacity=self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self):
+        """Forget buckets of chats that are not currently being throttled"""
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.is_idle()]:
+            del self._chats[chat_id]
+
+    async def _wait_for_slot(self, endpoint, data):
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+        if endpoint in UNTHROTTLED_ENDPOINTS:
+            return
+
+        chat_id = data.get("chat_id")
+        if chat_id is not None:
+            await self._chat_bucket(chat_id).acquire()
+        await self._global.acquire()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        max_retries = self.max_retries
+        if isinstance(rate_limit_args, dict):
+            max_retries = rate_limit_args.get("max_retries", max_retries)
+
+        attempt = 0
+        while True:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            try:
+                await self._wait_for_slot(endpoint, data)
+            finally:
+                self.waiting -= 1
+
+            self.in_flight += 1
+            instrumentation.record_telegram_call(endpoint)
+            try:
+                result = await callback(*args, **kwargs)
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                if attempt >= max_retries:
+                    self.failed += 1
+                    raise
+
+                attempt += 1
+                self.retries += 1
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+                # Back off a little more on each consecutive flood error
+                delay = retry_after * (1 + 0.5 * (attempt - 1))
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                logger.warning(f"Flood limit hit on {endpoint}, retrying in {delay:.1f}s (attempt {attempt}/{max_retries})")
+            finally:
+                self.in_flight -= 1
+
+    def stats(self):
+        return {
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "in_flight": self.in_flight,
+            "sent": self.sent,
+            "retries": self.retries,
+            "failed": self.failed,
+            "tracked_chats": len(self._chats)
+        }
+
+limiter = TelegramRateLimiter()
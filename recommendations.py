@@ -0,0 +1,204 @@
+"""
+Offline personalized recommendations.
+- A user's interest vector weighs the categories and keywords their searches matched
+  (decayed by age) plus those of the communities they submitted
+- Similarity to every approved community is one sparse matrix product per batch of
+  users (NumPy/SciPy, optional: without them the job is not scheduled)
+- The top RECOMMEND_TOP_N communities per user are stored in `recommendations` keyed
+  by telegramId, so /recommend is a single primary-key lookup
+
+Run directly to compute them once: python recommendations.py
+"""
+
+import logging
+import math
+from datetime import datetime, timezone
+from pymongo import ReplaceOne
+import config
+import database
+import repository
+from search_index import tokenize
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+logger = logging.getLogger(__name__)
+
+USER_PROJECTION = {"telegramId": 1, "searchHistory": 1, "submittedCommunities": 1}
+COMMUNITY_PROJECTION = {"name": 1, "category": 1, "keywords": 1, "score": 1, "members": 1}
+
+def available():
+    """True when NumPy and SciPy are installed"""
+    return np is not None
+
+class CommunityMatrix:
+    """Row-normalized community x feature matrix over category ("c:") and keyword ("k:") features"""
+
+    def __init__(self, communities):
+        self.ids = []
+        self.features = {}  # feature -> column
+        self.categories = {}  # stemmed category term -> category
+        rows, cols = [], []
+        popularity = []
+
+        for row, community in enumerate(communities):
+            self.ids.append(community["_id"])
+            category = community.get("category")
+            terms = {f"c:{category}"} if category else set()
+            if category:
+                for term in tokenize(category):
+                    self.categories[term] = category
+            for text in [community.get("name", "")] + list(community.get("keywords") or []):
+                terms.update(f"k:{term}" for term in tokenize(text))
+            for feature in terms:
+                rows.append(row)
+                cols.append(self.features.setdefault(feature, len(self.features)))
+            popularity.append(community.get("score") or math.log10(1 + (community.get("members") or 0)))
+
+        self.rows = {community_id: row for row, community_id in enumerate(self.ids)}
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(len(self.ids), max(len(self.features), 1))
+        )
+        self.matrix = _normalize_rows(matrix)
+
+        # Small boost for popular communities, mostly to break ties between equal matches
+        popularity = np.asarray(popularity, dtype=np.float32)
+        peak = popularity.max() if len(popularity) else 0
+        if peak > 0:
+            popularity /= peak
+        self.boost = sparse.diags(1 + config.RECOMMEND_POPULARITY_WEIGHT * popularity)
+
+    def query_features(self, query):
+        """Feature columns matched by one search query"""
+        columns = set()
+        for term in tokenize(query):
+            column = self.features.get(f"k:{term}")
+            if column is not None:
+                columns.add(column)
+            category = self.categories.get(term)
+            if category is not None:
+                columns.add(self.features[f"c:{category}"])
+        return columns
+
+def _normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+def _utc(when):
+    # Stored timestamps come back naive (UTC)
+    return when.replace(tzinfo=timezone.utc) if when.tzinfo is None else when
+
+def interest_vector(user, communities, now):
+    """(columns, weights, submitted rows) for one user"""
+    weights = {}
+    half_life = config.RECOMMEND_HALF_LIFE_HOURS * 3600
+    for entry in user.get("searchHistory") or []:
+        timestamp = entry.get("timestamp")
+        age = (now - _utc(timestamp)).total_seconds() if timestamp else 0
+        decay = 0.5 ** (max(age, 0) / half_life)
+        for column in communities.query_features(entry.get("query", "")):
+            weights[column] = weights.get(column, 0) + decay
+
+    submitted = [
+        communities.rows[community_id]
+        for community_id in user.get("submittedCommunities") or []
+        if community_id in communities.rows
+    ]
+    for row in submitted:
+        start, end = communities.matrix.indptr[row], communities.matrix.indptr[row + 1]
+        for column, value in zip(communities.matrix.indices[start:end], communities.matrix.data[start:end]):
+            weights[column] = weights.get(column, 0) + config.RECOMMEND_SUBMISSION_WEIGHT * value
+    return list(weights), list(weights.values()), submitted
+
+def top_communities(scores, row, exclude, top_n):
+    """Column indices of the top_n scores in one CSR row, best first"""
+    start, end = scores.indptr[row], scores.indptr[row + 1]
+    columns, values = scores.indices[start:end], scores.data[start:end]
+    if exclude:
+        keep = ~np.isin(columns, exclude)
+        columns, values = columns[keep], values[keep]
+    if len(values) > top_n:
+        best = np.argpartition(-values, top_n)[:top_n]
+        columns, values = columns[best], values[best]
+    return columns[np.argsort(-values, kind="stable")]
+
+def _score_batch(communities, users, now, top_n):
+    """Recommendations for a batch of users with one sparse matrix product"""
+    rows, cols, data, excluded = [], [], [], []
+    for row, user in enumerate(users):
+        columns, weights, submitted = interest_vector(user, communities, now)
+        rows.extend([row] * len(columns))
+        cols.extend(columns)
+        data.extend(weights)
+        excluded.append(submitted)
+
+    interests = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float32), (rows, cols)),
+        shape=(len(users), communities.matrix.shape[1])
+    )
+    scores = (_normalize_rows(interests) @ communities.matrix.T @ communities.boost).tocsr()
+
+    for row, user in enumerate(users):
+        best = top_communities(scores, row, excluded[row], top_n)
+        if len(best):
+            yield user["telegramId"], [communities.ids[column] for column in best]
+
+def compute_recommendations(now=None, top_n=config.RECOMMEND_TOP_N, batch_size=config.RECOMMEND_BATCH_SIZE):
+    """Recompute and store recommendations for every user with history; returns the number of users"""
+    if not available():
+        raise RuntimeError("NumPy and SciPy are required: pip install numpy scipy")
+
+    now = now or datetime.now(timezone.utc)
+    communities = CommunityMatrix(database.communities.find({"approved": True}, COMMUNITY_PROJECTION))
+    if not communities.ids:
+        return 0
+
+    cursor = database.users.find(
+        {"$or": [{"searchHistory.0": {"$exists": True}}, {"submittedCommunities.0": {"$exists": True}}]},
+        USER_PROJECTION
+    ).batch_size(batch_size)
+
+    stored = 0
+    batch = []
+
+    def flush():
+        ops = [
+            ReplaceOne(
+                {"_id": telegram_id},
+                {"communities": community_ids, "generatedAt": now},
+                upsert=True
+            )
+            for telegram_id, community_ids in _score_batch(communities, batch, now, top_n)
+        ]
+        if ops:
+            database.recommendations.bulk_write(ops, ordered=False)
+        return len(ops)
+
+    for user in cursor:
+        batch.append(user)
+        if len(batch) >= batch_size:
+            stored += flush()
+            batch = []
+    if batch:
+        stored += flush()
+
+    # Users whose history no longer matches anything keep no stale list
+    database.recommendations.delete_many({"generatedAt": {"$lt": now}})
+    return stored
+
+async def refresh_job(context):
+    """JobQueue callback for the periodic recommendation rebuild"""
+    try:
+        stored = await repository.run(compute_recommendations)
+    except Exception as e:
+        logger.error(f"Recommendation job error: {e}")
+        return
+    logger.info(f"Recommendations stored for {stored} users")
+
+if __name__ == "__main__":
+    print(f"Recommendations stored for {compute_recommendations()} users")
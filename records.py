@@ -0,0 +1,79 @@
+"""
+Compact community records for the read paths.
+- CommunityRecord keeps only the fields the views render, in __slots__
+  (no per-instance dict), for cached results, snapshots and the local index
+- from_document is the one place raw documents are normalized: both location
+  formats, missing fields and inconsistent casing
+- Per-view projections keep submitter info, metrics, timestamps etc. off the wire
+"""
+
+# Fields a community card (search result or browse listing) needs
+CARD_PROJECTION = {
+    "name": 1, "description": 1, "category": 1, "members": 1,
+    "language": 1, "location": 1, "link": 1, "approved": 1, "score": 1
+}
+
+# Card fields plus the text the local search index tokenizes
+INDEX_PROJECTION = {**CARD_PROJECTION, "keywords": 1}
+
+def city_of(location):
+    """City from either location format (plain string or {"city", "region"})"""
+    if isinstance(location, dict):
+        return location.get("city") or ""
+    return location or ""
+
+class CommunityRecord:
+    """Read-only view of one community, as rendered to users"""
+
+    __slots__ = (
+        "id", "name", "description", "category", "language",
+        "members", "city", "region", "link", "score", "approved"
+    )
+
+    def __init__(self, id, name, description, category, language, members, city, region, link, score, approved):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.category = category
+        self.language = language
+        self.members = members
+        self.city = city
+        self.region = region
+        self.link = link
+        self.score = score
+        self.approved = approved
+
+    @classmethod
+    def from_document(cls, document):
+        """Normalize a (possibly projected) MongoDB document"""
+        location = document.get("location")
+        return cls(
+            id=document["_id"],
+            name=document.get("name") or "",
+            description=document.get("description") or "",
+            category=(document.get("category") or "").lower(),
+            language=(document.get("language") or "").lower(),
+            members=document.get("members") or 0,
+            city=city_of(location),
+            region=(location.get("region") or "") if isinstance(location, dict) else "",
+            link=document.get("link") or "",
+            # Unscored documents sort last in MongoDB too (see pagination.keyset_query)
+            score=float(document.get("score") or 0),
+            approved=bool(document.get("approved"))
+        )
+
+    def with_score(self, score):
+        """Copy of the record with a new popularity score (records are shared, never mutated)"""
+        record = CommunityRecord(*self.__getstate__())
+        record.score = float(score)
+        return record
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+    def __repr__(self):
+        return f"CommunityRecord({self.id!r}, {self.name!r})"
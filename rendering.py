@@ -0,0 +1,146 @@
+"""
+Rendering of community cards and result messages.
+- HTML with every user-submitted value escaped, so names containing *, _ or [
+  can no longer make Telegram reject a send
+- Each community's card text and Join button are rendered once per version of
+  the record and served from an LRU cache; catalog changes evict the community
+- Search results go out as one message with a Join button per community; long
+  names and descriptions are shortened so a message stays under Telegram's limit
+"""
+
+import html
+from collections import OrderedDict
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+import config
+import repository
+
+PARSE_MODE = "HTML"
+
+# Telegram rejects messages longer than this; submitted descriptions are not length-checked
+MAX_MESSAGE_LENGTH = 4096
+MAX_NAME_LENGTH = 100
+MAX_DESCRIPTION_LENGTH = 300
+
+# Views a card is rendered for: search results show everything, category
+# pages ("c") show the location and location pages ("l") the category
+SEARCH = "search"
+
+class RenderCache:
+    """LRU of rendered cards keyed by (community id, view), checked against the record version"""
+
+    def __init__(self, max_size=config.RENDER_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # (community_id, view) -> (version, rendered)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_render(self, community, view, render):
+        key = (community.id, view)
+        version = community.__getstate__()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        rendered = render(community, view)
+        self._entries[key] = (version, rendered)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return rendered
+
+    def invalidate(self, community_id=None):
+        """Drop one community's cards, or everything"""
+        if community_id is None:
+            self._entries.clear()
+            return
+        for key in [key for key in self._entries if key[0] == community_id]:
+            del self._entries[key]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0
+        }
+
+cache = RenderCache()
+
+@repository.on_catalog_change
+def _evict_changed_card(community_id):
+    cache.invalidate(community_id)
+
+def shorten(text, limit):
+    """Cut text to at most limit characters, marking the cut with an ellipsis"""
+    text = text or ""
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+def _render_card(community, view):
+    # Shortened before escaping, so an entity like &amp; is never cut in half
+    lines = [
+        f"📱 <b>{html.escape(shorten(community.name, MAX_NAME_LENGTH))}</b>",
+        f"📝 {html.escape(shorten(community.description, MAX_DESCRIPTION_LENGTH))}",
+        f"👥 Members: {community.members:,}",
+        f"🗣️ Language: {html.escape(community.language.capitalize())}"
+    ]
+    if view != "l":
+        lines.append(f"📍 Location: {html.escape(community.city or 'Unknown')}")
+    if view != "c":
+        lines.append(f"🏷️ Category: {html.escape(community.category.capitalize())}")
+
+    # Button labels and URLs are not parsed, so they need no escaping
+    button = InlineKeyboardButton(f"Join {shorten(community.name, MAX_NAME_LENGTH)}", url=community.link)
+    return "\n".join(lines), button
+
+def card(community, view=SEARCH):
+    """(HTML text, Join button) for one community, from the cache when unchanged"""
+    return cache.get_or_render(community, view, _render_card)
+
+def _fit(header, communities, view):
+    """(text, cards) for the leading communities whose cards fit in one message"""
+    cards = [card(community, view) for community in communities]
+    text = header + "\n\n" + "\n\n".join(text for text, _ in cards)
+    # Escaping can still grow a card; drop trailing cards rather than fail the send
+    while len(text) > MAX_MESSAGE_LENGTH and len(cards) > 1:
+        cards.pop()
+        text = header + "\n\n" + "\n\n".join(text for text, _ in cards)
+    return text, cards
+
+def _message(header, communities, view):
+    text, cards = _fit(header, communities, view)
+    return text, InlineKeyboardMarkup([[button] for _, button in cards])
+
+def search_message(search_query, communities):
+    """(text, reply_markup) listing search results in a single message"""
+    header = f"Found {len(communities)} communities matching '{html.escape(shorten(search_query, MAX_NAME_LENGTH))}':"
+    return _message(header, communities, SEARCH)
+
+def recommendation_message(communities):
+    """(text, reply_markup) listing a user's recommended communities"""
+    return _message("Recommended for you based on your searches and submissions:", communities, SEARCH)
+
+def digest_message(communities):
+    """(text, reply_markup) for a weekly digest of new communities"""
+    return _message("🗞️ New communities this week matching your interests:", communities, SEARCH)
+
+def browse_message(title, total, kind, communities, navigation):
+    """(text, reply_markup, shown) for one page of a category ("c") or location ("l") listing
+
+    Trailing communities that do not fit are left for the next page: navigation(shown)
+    returns the Prev/Next buttons for the communities actually shown.
+    """
+    header = f"Found {total} communities in {html.escape(title)}:"
+    text, cards = _fit(header, communities, kind)
+    shown = communities[:len(cards)]
+    keyboard = [[button] for _, button in cards]
+    buttons = navigation(shown)
+    if buttons:
+        keyboard.append(buttons)
+    return text, InlineKeyboardMarkup(keyboard), shown
@@ -0,0 +1,350 @@
+"""
+Async data-access layer for the bot.
+- pymongo is synchronous, so every call runs on a bounded thread pool
+- Handlers await these functions instead of touching the collections directly
+- Read paths project only the fields a view needs and return CommunityRecord objects
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import OperationFailure
+import config
+import database
+import dedup
+from cache import query_cache, make_key
+from search_index import SearchIndex
+import catalog
+import pagination
+from records import CommunityRecord, CARD_PROJECTION, INDEX_PROJECTION
+
+logger = logging.getLogger(__name__)
+
+# Bounded pool: at most DB_EXECUTOR_WORKERS MongoDB calls in flight at once
+_executor = ThreadPoolExecutor(
+    max_workers=config.DB_EXECUTOR_WORKERS,
+    thread_name_prefix="mongo"
+)
+
+async def run(func, *args, **kwargs):
+    """Run a blocking database call on the executor and await its result"""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context variables into the worker thread (per-update accounting)
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
+
+def shutdown():
+    """Wait for in-flight database calls and stop the executor"""
+    _executor.shutdown(wait=True)
+
+# Catalog change hooks: called with the community id after an insert or approval
+_catalog_listeners = []
+
+def on_catalog_change(listener):
+    """Register a callable to be notified when the community catalog changes"""
+    _catalog_listeners.append(listener)
+    return listener
+
+def catalog_changed(community_id=None):
+    """Notify registered listeners that the catalog changed"""
+    for listener in _catalog_listeners:
+        listener(community_id)
+
+@on_catalog_change
+def _invalidate_query_cache(community_id):
+    query_cache.invalidate()
+
+# Optional in-process search index; Mongo $text is used until it is built
+local_index = SearchIndex(popularity_weight=config.SEARCH_POPULARITY_WEIGHT) if config.LOCAL_SEARCH_INDEX else None
+
+async def build_search_index():
+    """Build the local search index from all approved communities"""
+    if local_index is None:
+        return 0
+    documents = await run(lambda: list(database.communities.find({"approved": True}, INDEX_PROJECTION)))
+    local_index.build(documents)
+    query_cache.invalidate("search")
+    return len(local_index)
+
+# Browse listings served from memory once the first snapshot is built
+snapshot = catalog.CatalogSnapshot()
+_change_stream = None
+
+async def refresh_catalog():
+    """Rebuild the browse snapshot from all approved communities"""
+    records = await run(lambda: [
+        CommunityRecord.from_document(document)
+        for document in database.communities.find({"approved": True}, catalog.LISTING_PROJECTION)
+    ])
+    snapshot.build(records)
+    return len(records)
+
+def _apply_change(community):
+    """Apply a changed community document (INDEX_PROJECTION fields) to the in-memory views"""
+    if local_index is not None and local_index.ready:
+        if community.get("approved"):
+            local_index.add(community)
+        else:
+            local_index.remove(community["_id"])
+        query_cache.invalidate("search")
+    if snapshot.ready:
+        snapshot.apply(CommunityRecord.from_document(community))
+
+def _apply_delete(community_id):
+    if local_index is not None:
+        local_index.remove(community_id)
+        query_cache.invalidate("search")
+    snapshot.remove(community_id)
+
+def start_catalog_change_stream():
+    """Apply community changes made by any process to the snapshot and local index as they happen"""
+    global _change_stream
+    loop = asyncio.get_running_loop()
+    _change_stream = catalog.ChangeStreamWatcher(
+        database.communities,
+        on_change=lambda community: loop.call_soon_threadsafe(_apply_change, community),
+        on_delete=lambda community_id: loop.call_soon_threadsafe(_apply_delete, community_id),
+        # Keywords too: the local index tokenizes them
+        fields=INDEX_PROJECTION
+    )
+    _change_stream.start()
+
+def stop_catalog_change_stream():
+    if _change_stream is not None:
+        _change_stream.stop()
+
+async def scores_changed(scores):
+    """Move recomputed popularity scores ({community_id: score}) into the in-memory views"""
+    for community_id, score in scores.items():
+        # Only the record's score changes: no re-tokenizing or rebuilding
+        snapshot.update_score(community_id, score)
+        if local_index is not None:
+            local_index.update_score(community_id, score)
+    query_cache.invalidate()
+
+async def _refresh_changed_community(community_id):
+    """Bring in-memory views up to date with one changed community"""
+    community = await run(database.communities.find_one, {"_id": community_id}, INDEX_PROJECTION)
+    if community:
+        _apply_change(community)
+    else:
+        _apply_delete(community_id)
+
+# The loop only keeps weak references to tasks
+_background_tasks = set()
+
+def _background_task_done(task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"In-memory view refresh failed: {task.exception()}")
+
+@on_catalog_change
+def _update_in_memory_views(community_id):
+    if community_id is None:
+        return
+    if (local_index is None or not local_index.ready) and not snapshot.ready:
+        return
+    task = asyncio.get_running_loop().create_task(_refresh_changed_community(community_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_task_done)
+
+# Users
+async def upsert_user(user_data):
+    """Update or insert a user profile keyed by telegramId"""
+    await run(
+        database.users.update_one,
+        {"telegramId": user_data["telegramId"]},
+        {"$set": user_data},
+        upsert=True
+    )
+
+async def bulk_write_users(operations):
+    """Apply a batch of write operations to users in one unordered call"""
+    return await run(database.users.bulk_write, operations, ordered=False)
+
+async def add_submitted_community(telegram_id, community_id):
+    """Link a submitted community to the user who submitted it"""
+    await run(
+        database.users.update_one,
+        {"telegramId": telegram_id},
+        {"$push": {"submittedCommunities": community_id}}
+    )
+
+# Communities
+# Results are shared through the query cache, so callers must not mutate them
+def search_pipeline(search_query, limit):
+    """$text search ranked by textScore blended with the stored popularity score"""
+    return [
+        {"$match": {"$text": {"$search": search_query}, "approved": True}},
+        {"$addFields": {"rank": {"$add": [
+            {"$meta": "textScore"},
+            {"$multiply": [config.SEARCH_POPULARITY_WEIGHT, {"$ifNull": ["$score", 0]}]}
+        ]}}},
+        {"$sort": {"rank": -1}},
+        {"$limit": limit},
+        {"$project": CARD_PROJECTION}
+    ]
+
+async def search_communities(search_query, limit=5):
+    """Full text search over communities"""
+    if local_index is not None and local_index.ready:
+        return local_index.search(search_query, limit=limit)
+
+    return await query_cache.get_or_load(
+        make_key("search", search_query, limit=limit),
+        lambda: run(lambda: [
+            CommunityRecord.from_document(document)
+            for document in database.communities.aggregate(search_pipeline(search_query, limit))
+        ])
+    )
+
+def count_browse_cached(kind, key):
+    """Count from the in-memory snapshot, or None before it is built"""
+    return snapshot.count(kind, key) if snapshot.ready else None
+
+async def count_browse(kind, key):
+    """Number of approved communities in a category or city"""
+    if snapshot.ready:
+        return snapshot.count(kind, key)
+
+    return await query_cache.get_or_load(
+        make_key("count", key, scope=kind),
+        lambda: run(database.communities.count_documents, pagination.browse_filter(kind, key))
+    )
+
+async def browse_page(kind, key, cursor=None, direction=pagination.NEXT, page_size=config.PAGE_SIZE):
+    """
+    One page of a category/city listing, ordered by popularity score.
+    Returns (communities, has_prev, has_next).
+    """
+    if snapshot.ready:
+        return snapshot.page(kind, key, cursor, direction, page_size)
+
+    def load():
+        query, sort = pagination.keyset_query(pagination.browse_filter(kind, key), cursor, direction)
+        # Fetch one extra document to learn whether there is another page
+        records = [
+            CommunityRecord.from_document(document)
+            for document in database.communities.find(query, catalog.LISTING_PROJECTION).sort(sort).limit(page_size + 1)
+        ]
+        has_more = len(records) > page_size
+        records = records[:page_size]
+
+        if direction == pagination.PREV:
+            records.reverse()
+            return records, has_more, True
+        return records, cursor is not None, has_more
+
+    cache_key = make_key("page", key, scope=kind, cursor=cursor, direction=direction, size=page_size)
+    return await query_cache.get_or_load(cache_key, lambda: run(load))
+
+async def find_pending(limit=10):
+    """Oldest submissions still awaiting approval"""
+    return await run(
+        lambda: list(
+            database.pending_submissions.find({}, {"name": 1, "link": 1, "possibleDuplicates": 1})
+            .sort("_id", 1).limit(limit)
+        )
+    )
+
+async def find_recommendations(telegram_id):
+    """Precomputed recommendations for a user, best first (empty until the job has run)"""
+    document = await run(database.recommendations.find_one, {"_id": telegram_id})
+    community_ids = document["communities"] if document else []
+    if not community_ids:
+        return []
+
+    if snapshot.ready:
+        records = [snapshot.get(community_id) for community_id in community_ids]
+        return [record for record in records if record is not None]
+
+    documents = await run(lambda: list(
+        database.communities.find({"_id": {"$in": community_ids}, "approved": True}, CARD_PROJECTION)
+    ))
+    by_id = {document["_id"]: CommunityRecord.from_document(document) for document in documents}
+    return [by_id[community_id] for community_id in community_ids if community_id in by_id]
+
+async def find_member_refresh_candidates(stale_before, limit):
+    """Approved communities whose member count is missing or older than stale_before, most overdue first"""
+    return await run(lambda: list(
+        database.communities.find(
+            {"approved": True, "membersUpdatedAt": {"$not": {"$gte": stale_before}}},
+            {"link": 1}
+        )
+        # Missing timestamps sort first; popular communities go first among equals
+        .sort([("membersUpdatedAt", 1), ("score", -1)])
+        .limit(limit)
+    ))
+
+async def bulk_write_communities(operations):
+    """Apply a batch of write operations to communities in one unordered call"""
+    return await run(database.communities.bulk_write, operations, ordered=False)
+
+async def bulk_write_analytics(operations):
+    """Apply a batch of write operations to analytics in one unordered call"""
+    return await run(database.analytics.bulk_write, operations, ordered=False)
+
+async def find_by_link(link_key):
+    """Community listed or pending under a canonical link, if any"""
+    def find():
+        projection = {"name": 1, "approved": 1}
+        return (
+            database.communities.find_one({"linkKey": link_key}, projection)
+            or database.pending_submissions.find_one({"linkKey": link_key}, projection)
+        )
+    return await run(find)
+
+async def find_similar_communities(fields, limit=5):
+    """Likely duplicates of a submission among listings and pending submissions (indexed LSH lookup)"""
+    def find():
+        return (
+            dedup.find_similar(database.communities, fields)
+            + dedup.find_similar(database.pending_submissions, fields)
+        )
+    similar = await run(find)
+    return similar[:limit]
+
+async def insert_submission(community):
+    """Store a new submission for approval and return its id"""
+    result = await run(database.pending_submissions.insert_one, community)
+    return result.inserted_id
+
+# MongoDB error code for transactions on a standalone server
+_ILLEGAL_OPERATION = 20
+
+def _move_submission(community_id, when):
+    """Move a submission into communities, in a transaction where the deployment supports one"""
+    def move(session=None):
+        submission = database.pending_submissions.find_one({"_id": community_id}, session=session)
+        if submission is None:
+            return False
+        submission.update({"approved": True, "approvedAt": when, "updatedAt": when})
+        # Keyed by _id so that repeating an interrupted non-transactional move is harmless
+        database.communities.replace_one({"_id": community_id}, submission, upsert=True, session=session)
+        database.pending_submissions.delete_one({"_id": community_id}, session=session)
+        return True
+
+    try:
+        with database.client.start_session() as session:
+            return session.with_transaction(move)
+    except OperationFailure as e:
+        if e.code != _ILLEGAL_OPERATION:
+            raise
+    return move()
+
+async def approve_community(community_id, when):
+    """Approve a pending submission; returns False if there was nothing to approve"""
+    try:
+        community_id = ObjectId(community_id)
+    except (InvalidId, TypeError):
+        return False
+
+    if not await run(_move_submission, community_id, when):
+        return False
+
+    catalog_changed(community_id)
+    return True
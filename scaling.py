@@ -0,0 +1,139 @@
+"""
+Multi-process deployment roles.
+- ingress: receives updates (webhook or polling), deduplicates them by update_id
+  into the shared queue and drains workers' metrics counters into MongoDB
+- worker: claims queued updates and runs them through the normal handlers;
+  start as many workers as there are cores to spare
+
+All roles run on one host, sharing the SQLite state file (see shared.py).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+from telegram import Update
+from telegram.ext import ApplicationBuilder, ApplicationHandlerStop, TypeHandler
+import config
+import metrics
+import repository
+import shared
+from concurrency import ordering_key
+from ratelimit import limiter
+
+logger = logging.getLogger(__name__)
+
+def _require_store():
+    if shared.store is None:
+        raise RuntimeError(f"SCALE_ROLE={config.SCALE_ROLE} requires SHARED_STATE_PATH to be set")
+    return shared.store
+
+# Ingress
+async def enqueue_update(update: Update, context):
+    """Put an incoming update on the shared queue instead of handling it here"""
+    key = ordering_key(update)
+    queued = await repository.run(
+        context.bot_data["update_queue"].enqueue,
+        update.update_id,
+        f"{key[0]}:{key[1]}" if key else None,
+        json.dumps(update.to_dict())
+    )
+    if not queued:
+        logger.info(f"Skipping duplicate update {update.update_id}")
+    raise ApplicationHandlerStop
+
+async def drain_counters_job(context):
+    """Move metrics counters spooled by workers into MongoDB"""
+    try:
+        await metrics.drain_shared_counters(context.bot_data["counters"])
+    except Exception as e:
+        logger.error(f"Shared metrics drain error: {e}")
+
+async def purge_queue_job(context):
+    """Forget processed updates older than the dedup window"""
+    queue = context.bot_data["update_queue"]
+    await repository.run(queue.purge)
+    logger.info(f"Shared update queue depth: {await repository.run(queue.depth)}")
+
+async def _ingress_shutdown(application):
+    try:
+        await metrics.drain_shared_counters(application.bot_data["counters"])
+    except Exception as e:
+        logger.error(f"Shared metrics drain error: {e}")
+    repository.shutdown()
+
+def build_ingress_application():
+    """Application that only queues updates for workers"""
+    store = _require_store()
+    application = (
+        ApplicationBuilder()
+        .token(config.BOT_TOKEN)
+        # The catalog jobs (bot.schedule_catalog_jobs) call the Bot API from this process
+        .rate_limiter(limiter)
+        .post_shutdown(_ingress_shutdown)
+        .build()
+    )
+    application.bot_data["update_queue"] = shared.UpdateQueue(store)
+    application.bot_data["counters"] = shared.SharedCounters(store)
+
+    application.add_handler(TypeHandler(Update, enqueue_update))
+    application.job_queue.run_repeating(drain_counters_job, interval=config.METRICS_FLUSH_INTERVAL)
+    application.job_queue.run_repeating(purge_queue_job, interval=600, first=600)
+    return application
+
+# Worker
+async def _process(application, queue, update_id, payload):
+    try:
+        update = Update.de_json(json.loads(payload), application.bot)
+        # Handler errors are reported through the application's error handlers
+        await application.process_update(update)
+    except Exception as e:
+        logger.error(f"Worker failed on update {update_id}: {e}")
+    finally:
+        await repository.run(queue.complete, update_id)
+
+async def _worker_loop(application):
+    queue = shared.UpdateQueue(_require_store())
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop.set)
+
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        logger.info(f"Worker {worker_id} started")
+
+        in_flight = set()
+        while not stop.is_set():
+            free = config.CONCURRENT_UPDATES - len(in_flight)
+            if free <= 0:
+                await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            claimed = await repository.run(queue.claim, worker_id, free)
+            for update_id, payload in claimed:
+                task = asyncio.create_task(_process(application, queue, update_id, payload))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+
+            if not claimed:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=config.WORKER_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+        logger.info(f"Worker {worker_id} stopping, finishing {len(in_flight)} updates")
+        await asyncio.gather(*in_flight, return_exceptions=True)
+        await application.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+def run_worker(application):
+    """Process queued updates with a fully configured Application until interrupted"""
+    asyncio.run(_worker_loop(application))
@@ -0,0 +1,196 @@
+"""
+In-process inverted index for community search.
+- Ethiopic normalization folds character variants (ሀ/ሐ/ኀ, ሰ/ሠ, አ/ዐ, ጸ/ፀ)
+- Light English suffix stemming
+- Prefix matching on query terms
+- BM25 ranking blended with the popularity score
+- Only a CommunityRecord is kept per community; documents are dropped after tokenizing
+"""
+
+import bisect
+import math
+import re
+from collections import defaultdict
+from records import CommunityRecord
+
+# Rows of the Ethiopic syllabary that are pronounced the same in Amharic.
+# Each row spans 8 code points (the 7 vowel orders plus the labialized form).
+_ETHIOPIC_VARIANT_ROWS = {
+    0x1210: 0x1200,  # ሐ -> ሀ
+    0x1280: 0x1200,  # ኀ -> ሀ
+    0x1220: 0x1230,  # ሠ -> ሰ
+    0x12D0: 0x12A0,  # ዐ -> አ
+    0x1340: 0x1338,  # ፀ -> ጸ
+}
+
+_ETHIOPIC_FOLD = {
+    source + offset: chr(target + offset)
+    for source, target in _ETHIOPIC_VARIANT_ROWS.items()
+    for offset in range(8)
+}
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Field weights: a term in the name counts as much as three in the description
+FIELD_WEIGHTS = {"name": 3, "keywords": 2, "description": 1}
+
+def normalize(text):
+    """Lowercase text and fold Ethiopic character variants"""
+    return text.lower().translate(_ETHIOPIC_FOLD)
+
+def stem(token):
+    """Strip common English suffixes (Ethiopic and short tokens are left alone)"""
+    if not token.isascii() or len(token) <= 3:
+        return token
+
+    for suffix, replacement in (("sses", "ss"), ("ies", "y")):
+        if token.endswith(suffix):
+            return token[:-len(suffix)] + replacement
+
+    for suffix in ("ational", "ization", "fulness", "ousness", "iveness",
+                   "ments", "ment", "ness", "ings", "ing", "edly", "ed", "ly", "ers", "er"):
+        stripped = token[:-len(suffix)]
+        if token.endswith(suffix) and len(stripped) >= 3:
+            # "running" -> "run", "hopped" -> "hop"
+            if len(stripped) > 3 and stripped[-1] == stripped[-2] and stripped[-1] not in "lsz":
+                stripped = stripped[:-1]
+            return stripped
+
+    if token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+def tokenize(text):
+    """Split text into normalized, stemmed terms"""
+    return [stem(token) for token in _TOKEN_RE.findall(normalize(text))]
+
+def popularity(record):
+    """Stored popularity score, or the members-only part of it before it is computed"""
+    return record.score or math.log10(1 + record.members)
+
+def _document_text(community, field):
+    value = community.get(field) or ""
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(item) for item in value)
+    return str(value)
+
+class SearchIndex:
+    """BM25 inverted index over approved communities"""
+
+    def __init__(self, k1=1.2, b=0.75, popularity_weight=0.3, prefix_weight=0.5, max_prefix_terms=20):
+        self.k1 = k1
+        self.b = b
+        self.popularity_weight = popularity_weight
+        self.prefix_weight = prefix_weight
+        self.max_prefix_terms = max_prefix_terms
+        self.ready = False
+        self._postings = defaultdict(dict)  # term -> {community_id: weighted tf}
+        self._doc_terms = {}  # community_id -> {term: weighted tf}
+        self._doc_length = {}  # community_id -> weighted length
+        self._documents = {}  # community_id -> CommunityRecord
+        self._total_length = 0
+        self._sorted_terms = []
+        self._terms_dirty = False
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __contains__(self, community_id):
+        return community_id in self._documents
+
+    def build(self, communities):
+        """Index a full set of communities, replacing any previous contents"""
+        self.__init__(self.k1, self.b, self.popularity_weight, self.prefix_weight, self.max_prefix_terms)
+        for community in communities:
+            self.add(community)
+        self.ready = True
+
+    def add(self, community):
+        """Index (or re-index) a single community document"""
+        community_id = community["_id"]
+        self.remove(community_id)
+
+        terms = defaultdict(int)
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(_document_text(community, field)):
+                terms[term] += weight
+
+        for term, frequency in terms.items():
+            if term not in self._postings:
+                self._terms_dirty = True
+            self._postings[term][community_id] = frequency
+
+        length = sum(terms.values())
+        self._doc_terms[community_id] = dict(terms)
+        self._doc_length[community_id] = length
+        self._documents[community_id] = CommunityRecord.from_document(community)
+        self._total_length += length
+
+    def remove(self, community_id):
+        """Drop a community from the index if present"""
+        terms = self._doc_terms.pop(community_id, None)
+        if terms is None:
+            return
+
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(community_id, None)
+            if not postings:
+                del self._postings[term]
+                self._terms_dirty = True
+
+        self._total_length -= self._doc_length.pop(community_id)
+        del self._documents[community_id]
+
+    def update_score(self, community_id, score):
+        """Replace the popularity score used in ranking; postings are left as they are"""
+        record = self._documents.get(community_id)
+        if record is not None:
+            self._documents[community_id] = record.with_score(score)
+
+    def _expand(self, term):
+        """Indexed terms starting with `term` (excluding the term itself)"""
+        if self._terms_dirty:
+            self._sorted_terms = sorted(self._postings)
+            self._terms_dirty = False
+
+        expanded = []
+        start = bisect.bisect_left(self._sorted_terms, term)
+        for candidate in self._sorted_terms[start:]:
+            if not candidate.startswith(term) or len(expanded) >= self.max_prefix_terms:
+                break
+            if candidate != term:
+                expanded.append(candidate)
+        return expanded
+
+    def _idf(self, term):
+        document_frequency = len(self._postings.get(term, ()))
+        return math.log(1 + (len(self._documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def search(self, query, limit=5):
+        """Return up to `limit` community records ranked by BM25 + popularity score"""
+        if not self._documents:
+            return []
+
+        average_length = self._total_length / len(self._documents)
+        scores = defaultdict(float)
+
+        for query_term in set(tokenize(query)):
+            candidates = [(query_term, 1.0)]
+            candidates += [(term, self.prefix_weight) for term in self._expand(query_term)]
+
+            for term, weight in candidates:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = self._idf(term)
+                for community_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_length[community_id] / average_length)
+                    scores[community_id] += weight * idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        ranked = []
+        for community_id, score in scores.items():
+            ranked.append((score + self.popularity_weight * popularity(self._documents[community_id]), community_id))
+
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        return [self._documents[community_id] for _, community_id in ranked[:limit]]
@@ -0,0 +1,277 @@
+"""
+State shared between bot processes, backed by a single SQLite file.
+- UpdateQueue: webhook updates deduplicated by update_id and claimed by workers,
+  with at most one update in flight per user across all workers
+- SharedQueryCache: query cache visible to every process (TTL expiry, oldest
+  entries evicted first); its async methods keep SQLite off the event loop
+- SharedCounters: metrics increments spooled by workers and drained by the ingress
+
+Scaling is limited to one host: every process must point SHARED_STATE_PATH at
+the same local file. SQLite locking is unreliable on network filesystems, so
+processes on different machines cannot share it.
+"""
+
+import asyncio
+import pickle
+import sqlite3
+import threading
+import time
+from bson import ObjectId
+import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS updates (
+    update_id INTEGER PRIMARY KEY,
+    ordering_key TEXT,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    claimed_by TEXT,
+    claimed_at REAL,
+    completed_at REAL
+);
+CREATE INDEX IF NOT EXISTS updates_pending ON updates (completed_at, update_id);
+CREATE INDEX IF NOT EXISTS updates_ordering ON updates (ordering_key, completed_at, update_id);
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    value BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    community_id TEXT NOT NULL,
+    field TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    PRIMARY KEY (community_id, field)
+);
+"""
+
+class SharedStore:
+    """Thread-safe wrapper around one SQLite connection"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def execute(self, sql, params=()):
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+    def transaction(self, work):
+        """Run work(connection) inside an IMMEDIATE transaction and return its result"""
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(connection)
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+            return result
+
+class UpdateQueue:
+    """Durable update queue with dedup by update_id and per-user ordering"""
+
+    def __init__(self, store, visibility_timeout=config.SHARED_VISIBILITY_TIMEOUT,
+                 dedup_window=config.SHARED_DEDUP_WINDOW):
+        self.store = store
+        self.visibility_timeout = visibility_timeout
+        self.dedup_window = dedup_window
+
+    def enqueue(self, update_id, ordering_key, payload):
+        """Add an update; returns False if this update_id was already seen"""
+        rows = self.store.execute(
+            "INSERT OR IGNORE INTO updates (update_id, ordering_key, payload, enqueued_at) "
+            "VALUES (?, ?, ?, ?) RETURNING update_id",
+            (update_id, ordering_key, payload, time.time())
+        )
+        return bool(rows)
+
+    def claim(self, worker_id, limit):
+        """
+        Claim up to `limit` pending updates for a worker.
+        Only the oldest pending update of each user is handed out, and only when no
+        other update of that user is in flight, so per-user order is preserved.
+        Claims older than the visibility timeout are treated as abandoned.
+        """
+        def work(connection):
+            now = time.time()
+            stale = now - self.visibility_timeout
+            rows = connection.execute(
+                """
+                SELECT update_id, payload FROM updates AS u
+                WHERE completed_at IS NULL
+                  AND (claimed_at IS NULL OR claimed_at < :stale)
+                  AND (ordering_key IS NULL OR NOT EXISTS (
+                      SELECT 1 FROM updates AS earlier
+                      WHERE earlier.ordering_key = u.ordering_key
+                        AND earlier.completed_at IS NULL
+                        AND earlier.update_id < u.update_id
+                  ))
+                ORDER BY update_id
+                LIMIT :limit
+                """,
+                {"stale": stale, "limit": limit}
+            ).fetchall()
+            connection.executemany(
+                "UPDATE updates SET claimed_by = ?, claimed_at = ? WHERE update_id = ?",
+                [(worker_id, now, update_id) for update_id, _ in rows]
+            )
+            return rows
+
+        return self.store.transaction(work)
+
+    def complete(self, update_id):
+        """Mark an update as processed (kept for the dedup window)"""
+        self.store.execute("UPDATE updates SET completed_at = ? WHERE update_id = ?", (time.time(), update_id))
+
+    def purge(self):
+        """Forget processed updates older than the dedup window"""
+        self.store.execute(
+            "DELETE FROM updates WHERE completed_at IS NOT NULL AND completed_at < ?",
+            (time.time() - self.dedup_window,)
+        )
+
+    def depth(self):
+        """Number of updates not processed yet"""
+        return self.store.execute("SELECT COUNT(*) FROM updates WHERE completed_at IS NULL")[0][0]
+
+async def _run(func, *args):
+    # repository imports this module (through cache.py), so it is imported on first use
+    import repository
+    return await repository.run(func, *args)
+
+class SharedQueryCache:
+    """
+    QueryCache interface on top of the shared store (values are pickled).
+    Unlike the in-memory cache, eviction is first-in-first-out: a hit is not
+    written back, so reads never take the SQLite write lock.
+    """
+
+    def __init__(self, store, ttl=config.CACHE_TTL, max_size=config.CACHE_MAX_SIZE):
+        self.store = store
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0  # entries after the last write from this process
+        self._invalidated_at = {}  # kind (None = all) -> time of the last local invalidation
+        self._deletes = set()
+
+    def __len__(self):
+        return self.store.execute("SELECT COUNT(*) FROM cache")[0][0]
+
+    def _valid_after(self, kind):
+        """Entries expiring before this were written before a local invalidation"""
+        invalidated_at = max(self._invalidated_at.get(None, 0), self._invalidated_at.get(kind, 0))
+        return max(time.time(), invalidated_at + self.ttl)
+
+    def get(self, key, default=None):
+        rows = self.store.execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (repr(key), self._valid_after(key[0]))
+        )
+        if not rows:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return pickle.loads(rows[0][0])
+
+    def set(self, key, value):
+        def work(connection):
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, kind, expires_at, value) VALUES (?, ?, ?, ?)",
+                (repr(key), key[0], time.time() + self.ttl, pickle.dumps(value))
+            )
+            # Expired entries go first, then the oldest (every entry has the same TTL)
+            connection.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+            evicted = connection.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,)
+            ).rowcount
+            self.evictions += max(evicted, 0)
+            self.size = connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+        self.store.transaction(work)
+
+    async def get_or_load(self, key, loader):
+        value = await _run(self.get, key, _MISSING)
+        if value is _MISSING:
+            value = await loader()
+            await _run(self.set, key, value)
+        return value
+
+    def _delete(self, kind):
+        if kind is None:
+            self.store.execute("DELETE FROM cache")
+        else:
+            self.store.execute("DELETE FROM cache WHERE kind = ?", (kind,))
+        self.size = len(self)
+
+    def invalidate(self, kind=None):
+        """
+        Drop all entries, or only those of one query kind.
+        Takes effect in this process at once; the rows are deleted on the
+        executor when called from the event loop, so other processes see it shortly after.
+        """
+        self._invalidated_at[kind] = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._delete(kind)
+            return
+        task = loop.create_task(_run(self._delete, kind))
+        # The loop only keeps weak references to tasks
+        self._deletes.add(task)
+        task.add_done_callback(self._deletes.discard)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            # Read from the last set() rather than counted, so gauges do not touch SQLite
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0
+        }
+
+_MISSING = object()
+
+class SharedCounters:
+    """Metrics increments spooled by workers until the ingress drains them"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def add(self, pending):
+        """Add {community_id: {field: amount}} to the spool"""
+        rows = [
+            (str(community_id), field, amount)
+            for community_id, fields in pending.items()
+            for field, amount in fields.items()
+        ]
+        self.store.transaction(lambda connection: connection.executemany(
+            "INSERT INTO counters (community_id, field, amount) VALUES (?, ?, ?) "
+            "ON CONFLICT (community_id, field) DO UPDATE SET amount = amount + excluded.amount",
+            rows
+        ))
+
+    def drain(self):
+        """Atomically take everything in the spool as {ObjectId: {field: amount}}"""
+        def work(connection):
+            rows = connection.execute("SELECT community_id, field, amount FROM counters").fetchall()
+            connection.execute("DELETE FROM counters")
+            return rows
+
+        pending = {}
+        for community_id, field, amount in self.store.transaction(work):
+            pending.setdefault(ObjectId(community_id), {})[field] = amount
+        return pending
+
+store = SharedStore(config.SHARED_STATE_PATH) if config.SHARED_STATE_PATH else None
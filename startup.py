@@ -0,0 +1,107 @@
+"""
+Non-blocking startup lifecycle.
+- Runs in the background from the Application's post_init hook, so the bot
+  accepts updates immediately (in a degraded mode until startup completes)
+- Index reconciliation, sample data seeding, popularity scores, search index
+  build, catalog snapshot and cache warm-up run concurrently once MongoDB is reachable
+- Workers (SCALE_ROLE=worker) only build their in-memory views; index reconciliation,
+  seeding and popularity scores run once, in the ingress
+- MongoDB is retried with exponential backoff until it is reachable
+- Every phase is timed and logged; stats() exposes readiness and phase timings as gauges
+"""
+
+import asyncio
+import logging
+import time
+import config
+import database
+import repository
+import popularity
+
+logger = logging.getLogger(__name__)
+
+# Phase name -> (succeeded, seconds); "ready" is set once every phase has finished
+state = {"ready": False, "connect_attempts": 0, "phases": {}}
+
+async def timed(name, awaitable):
+    """Await a startup phase, logging how long it took; returns its result or None on error"""
+    started = time.monotonic()
+    try:
+        result = await awaitable
+        succeeded = True
+    except Exception as e:
+        logger.error(f"Startup phase '{name}' failed: {e}")
+        result = None
+        succeeded = False
+
+    elapsed = time.monotonic() - started
+    state["phases"][name] = (succeeded, elapsed)
+    logger.info(f"Startup phase '{name}' finished in {elapsed * 1000:.0f} ms")
+    return result
+
+def stats():
+    """Readiness, connection attempts and phase durations for the metrics registry"""
+    gauges = {"ready": int(state["ready"]), "connect_attempts": state["connect_attempts"]}
+    for name, (succeeded, seconds) in state["phases"].items():
+        gauges[f"{name} seconds"] = round(seconds, 3)
+    return gauges
+
+async def connect():
+    """Ping MongoDB until it answers, waiting 1s, 2s, 4s... (capped) between attempts"""
+    delay = 1
+    while True:
+        state["connect_attempts"] += 1
+        if await timed("connect", repository.run(database.ping)):
+            return
+        logger.warning(f"Running in degraded mode: MongoDB is not reachable, retrying in {delay}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, config.STARTUP_CONNECT_MAX_DELAY)
+
+async def build_search_index():
+    indexed = await repository.build_search_index()
+    if repository.local_index is not None:
+        logger.info(f"Local search index built with {indexed} communities")
+
+async def build_catalog_snapshot():
+    loaded = await repository.refresh_catalog()
+    logger.info(f"Catalog snapshot built with {loaded} communities")
+    repository.start_catalog_change_stream()
+
+async def warm_cache():
+    """Load the first page of every category and location into the query cache"""
+    pages = [repository.browse_page("c", category) for category in config.CATEGORIES]
+    pages += [repository.browse_page("l", location) for location in config.LOCATIONS]
+    await asyncio.gather(*pages)
+
+def _catalog_owner():
+    """Workers leave seeding, scores and index reconciliation to the ingress (or single) process"""
+    return config.SCALE_ROLE != "worker"
+
+async def _seed_and_load():
+    if _catalog_owner():
+        # The search index and cache have to see the sample data, so seeding goes first
+        await timed("sample data", repository.run(database.seed_if_empty))
+        # Communities without a score would sort last until the first scheduled run
+        await timed("popularity scores", repository.run(popularity.compute_scores))
+    await asyncio.gather(
+        timed("search index", build_search_index()),
+        timed("catalog snapshot", build_catalog_snapshot())
+    )
+    if not repository.snapshot.ready:
+        # Browsing falls back to MongoDB, so at least have the first pages cached
+        await timed("cache warm-up", warm_cache())
+
+async def run():
+    started = time.monotonic()
+
+    await connect()
+    if _catalog_owner():
+        await asyncio.gather(
+            timed("indexes", repository.run(database.setup_indexes)),
+            _seed_and_load()
+        )
+    else:
+        await _seed_and_load()
+
+    state["ready"] = True
+    logger.info(f"Startup completed in {time.monotonic() - started:.2f}s")
@@ -0,0 +1,80 @@
+import time
+from bson import ObjectId
+import shared
+
+def make_queue(tmp_path, **kwargs):
+    return shared.UpdateQueue(shared.SharedStore(str(tmp_path / "shared.db")), **kwargs)
+
+def test_enqueue_deduplicates_update_ids(tmp_path):
+    queue = make_queue(tmp_path)
+    assert queue.enqueue(1, "user:7", "{}")
+    assert not queue.enqueue(1, "user:7", "{}")
+    assert queue.depth() == 1
+
+def test_claim_hands_out_one_update_per_user_in_order(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue(1, "user:7", "a")
+    queue.enqueue(2, "user:7", "b")
+    queue.enqueue(3, "user:8", "c")
+    queue.enqueue(4, None, "d")
+
+    assert queue.claim("w1", 10) == [(1, "a"), (3, "c"), (4, "d")]
+    # user:7's second update waits until the first one is completed
+    assert queue.claim("w2", 10) == []
+
+    queue.complete(1)
+    assert queue.claim("w2", 10) == [(2, "b")]
+
+def test_claim_respects_limit(tmp_path):
+    queue = make_queue(tmp_path)
+    for update_id in range(1, 6):
+        queue.enqueue(update_id, f"user:{update_id}", str(update_id))
+    assert [update_id for update_id, _ in queue.claim("w1", 2)] == [1, 2]
+    assert [update_id for update_id, _ in queue.claim("w2", 10)] == [3, 4, 5]
+
+def test_abandoned_claims_are_handed_out_again(tmp_path):
+    queue = make_queue(tmp_path, visibility_timeout=0.05)
+    queue.enqueue(1, "user:7", "a")
+    assert queue.claim("w1", 10) == [(1, "a")]
+    assert queue.claim("w2", 10) == []
+
+    time.sleep(0.1)
+    assert queue.claim("w2", 10) == [(1, "a")]
+
+def test_completed_updates_stay_deduplicated_until_purged(tmp_path):
+    queue = make_queue(tmp_path, dedup_window=0)
+    queue.enqueue(1, None, "a")
+    queue.complete(1)
+    assert queue.depth() == 0
+    assert not queue.enqueue(1, None, "a")
+
+    time.sleep(0.01)
+    queue.purge()
+    assert queue.enqueue(1, None, "a")
+
+def test_counters_add_accumulates_and_drain_empties(tmp_path):
+    counters = shared.SharedCounters(shared.SharedStore(str(tmp_path / "shared.db")))
+    first, second = ObjectId(), ObjectId()
+    counters.add({first: {"clicks": 2, "searchHits": 1}})
+    counters.add({first: {"clicks": 3}, second: {"searchHits": 4}})
+
+    assert counters.drain() == {
+        first: {"clicks": 5, "searchHits": 1},
+        second: {"searchHits": 4}
+    }
+    assert counters.drain() == {}
+
+def test_query_cache_evicts_oldest_and_invalidates_by_kind(tmp_path):
+    cache = shared.SharedQueryCache(shared.SharedStore(str(tmp_path / "shared.db")), ttl=60, max_size=2)
+    cache.set(("search", "a", ()), [1])
+    time.sleep(0.01)
+    cache.set(("page", "b", ()), [2])
+    time.sleep(0.01)
+    cache.set(("search", "c", ()), [3])
+
+    assert cache.get(("search", "a", ())) is None
+    assert cache.get(("page", "b", ())) == [2]
+
+    cache.invalidate("search")
+    assert cache.get(("search", "c", ())) is None
+    assert cache.get(("page", "b", ())) == [2]
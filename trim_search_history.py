@@ -0,0 +1,13 @@
+"""
+One-off migration: trim oversized searchHistory arrays in the users collection
+Usage: python trim_search_history.py [limit]
+"""
+
+import sys
+import config
+from database import trim_search_history
+
+if __name__ == "__main__":
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else config.SEARCH_HISTORY_LIMIT
+    modified = trim_search_history(limit)
+    print(f"Trimmed searchHistory to {limit} entries on {modified} user documents")